@@ -333,6 +333,12 @@ SHARED_CSS = """
 </style>
 """
 
+@st.cache_resource
+def get_rag_system():
+    """One RAG system per server process, shared by reruns, background ingestion and sessions"""
+    from services.rag_system import RAGSystem
+    return RAGSystem()
+
 # Import page modules
 def landing_page():
     """Landing page content"""
@@ -506,7 +512,7 @@ def analyzer_page():
     import plotly.graph_objects as go
     import plotly.express as px
     from services.document_processor import DocumentProcessor
-    from services.rag_system import RAGSystem
+    from services.ingestion_pipeline import IngestionPipeline, content_digest
     from services.agent_orchestrator import AgentOrchestrator
     from services.professional_report_generator import ProfessionalReportGenerator
     from services.gmail_sender import GmailSender
@@ -538,6 +544,8 @@ def analyzer_page():
         ss.analysis_results = None
     if 'startup_id' not in ss:
         ss.startup_id = None
+    if 'ingest' not in ss:
+        ss.ingest = None
     
        
     # ---------------- TAB 1: UPLOAD & ANALYZE ----------------
@@ -631,7 +639,7 @@ def analyzer_page():
             with st.expander("📧 Email Threads"):
                 emails = st.file_uploader(
                     "Upload email communications",
-                    type=["txt", "docx"],
+                    type=["txt", "docx", "eml", "mbox"],
                     accept_multiple_files=True,
                     key="emails"
                 )
@@ -650,6 +658,27 @@ def analyzer_page():
                     for u in updates:
                         st.success(f"✅ {u.name}")
 
+        uploaded_files = {
+            'pitch_deck': pitch_deck,
+            'transcripts': transcripts if transcripts else [],
+            'emails': emails if emails else [],
+            'updates': updates if updates else []
+        }
+        
+        # Start indexing every upload in the background right away; a new pitch deck means a new startup
+        if pitch_deck or transcripts or emails or updates:
+            new_deck = pitch_deck and ss.ingest and ss.ingest.deck_digest not in (None, content_digest(pitch_deck))
+            if ss.ingest is None or new_deck:
+                if ss.ingest is not None:
+                    # The replaced deck's startup: stop its jobs and drop what it indexed
+                    ss.ingest.close()
+                ss.startup_id = str(uuid.uuid4())
+                ss.ingest = IngestionPipeline(DocumentProcessor(), get_rag_system(), ss.startup_id)
+            ss.ingest.sync(uploaded_files)
+            
+            indexed, total = ss.ingest.status()
+            st.caption(f"⚡ Indexing in the background: {indexed}/{total} documents ready")
+        
         # Analyze button - FIXED with centered container
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -660,36 +689,22 @@ def analyzer_page():
             if st.button("🚀 START ANALYSIS", disabled=not pitch_deck, key="analyze_btn", type="primary", use_container_width=True):
                 with st.spinner("🔄 Processing documents and running AI analysis..."):
                     try:
-                        # Initialize systems
-                        processor = DocumentProcessor()
-                        rag = RAGSystem()
+                        # Initialize systems (documents were ingested in the background since upload)
+                        rag = ss.ingest.rag
                         orchestrator = AgentOrchestrator(rag)
-                        
-                        # Generate unique ID
-                        startup_id = str(uuid.uuid4())
-                        ss.startup_id = startup_id
+                        startup_id = ss.startup_id
                         
                         # Progress tracking
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        # Step 1: Process documents
-                        status_text.text("📄 Processing documents...")
-                        progress_bar.progress(10)
-                        
-                        uploaded_files = {
-                            'pitch_deck': pitch_deck,
-                            'transcripts': transcripts if transcripts else [],
-                            'emails': emails if emails else [],
-                            'updates': updates if updates else []
-                        }
-                        
-                        extracted_data = processor.process_uploaded_files(uploaded_files)
-                        progress_bar.progress(25)
-                        
-                        # Step 2: Add to RAG
+                        # Step 1 & 2: Only the pitch deck has to be indexed before the first agents start
                         status_text.text("🧠 Building knowledge base...")
-                        rag.add_documents(extracted_data, startup_id)
+                        progress_bar.progress(10)
+                        ss.ingest.wait(
+                            ("pitch_deck",),
+                            progress_callback=lambda done, total: progress_bar.progress(10 + int(30 * done / max(total, 1)))
+                        )
                         progress_bar.progress(40)
                         
                         # Step 3: Run agents
@@ -699,8 +714,13 @@ def analyzer_page():
                         for i in range(1, 7):
                             progress_bar.progress(40 + (i * 10))
                         
-                        # Run analysis
-                        results = orchestrator.analyze_startup(startup_id)
+                        # Run analysis; supplementary documents keep indexing and agents wait for them as needed
+                        results = orchestrator.analyze_startup(startup_id, readiness=ss.ingest)
+                        for parse in ss.ingest.processor.parse_metrics:
+                            if parse['status'] != "ok":
+                                st.warning(f"⚠️ {parse['filename']}: parsing stopped ({parse['status']}), using the {parse['pages']} pages read so far")
+                        for degraded in results.get('degraded', []):
+                            st.warning(f"⚠️ {degraded['agent'].replace('_', ' ').title()} degraded ({degraded['reason']}), showing default output")
                         
                         # Store results
                         ss.analysis_results = results
@@ -944,6 +964,18 @@ def analyzer_page():
             
             st.divider()
             
+            # SIMILAR STARTUPS
+            similar_startups = results.get('similar_startups', [])
+            if similar_startups:
+                st.markdown("### 🧭 Similar Startups Analysed Before")
+                for other in similar_startups:
+                    st.markdown(
+                        f"- **{other['name']}** · {other['sector']} · {other['stage']} "
+                        f"— similarity {other['similarity']:.0%}"
+                    )
+                
+                st.divider()
+            
             # FOLLOW-UP QUESTIONS
             st.markdown("### 💡 Suggested Follow-up Questions")
             for i, question in enumerate(recommendation['follow_up_questions'], 1):
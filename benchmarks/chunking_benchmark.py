@@ -0,0 +1,99 @@
+"""
+Compare the character splitter against the token-aware splitter.
+
+Reports, per mode: chunk count, word-pieces the embedding model silently
+truncates, embedding time through the HF endpoint, and retrieval recall@k
+for probe sentences sampled from the document itself (a probe is a hit when
+a top-k chunk contains it).
+
+Usage:
+    python -m benchmarks.chunking_benchmark [pdf ...] [--k 5] [--probes 40]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+from config import EMBEDDING_MAX_TOKENS
+from services.document_processor import DocumentProcessor, get_embedding_tokenizer
+from services.rag_system import RAGSystem
+
+DEFAULT_FIXTURES = ["uploads/Pitch-Example-Air-BnB-PDF.pdf"]
+
+
+def sample_probes(text, n_probes, seed=0):
+    """Pick sentences of 6-30 words to use as self-supervised retrieval probes"""
+    sentences = [
+        s.strip() for s in re.split(r"(?<=[.!?])\s+|\n{2,}", text)
+        if 6 <= len(s.split()) <= 30
+    ]
+    rng = random.Random(seed)
+    return rng.sample(sentences, min(n_probes, len(sentences)))
+
+
+def truncated_tokens(chunks, tokenizer):
+    """Word-pieces past the model window that are paid for but never embedded"""
+    lost = 0
+    for chunk in chunks:
+        n_tokens = len(tokenizer.tokenize(chunk)) + 2
+        lost += max(0, n_tokens - EMBEDDING_MAX_TOKENS)
+    return lost
+
+
+def recall_at_k(chunks, chunk_vectors, probes, probe_vectors, k):
+    """Fraction of probes whose source chunk is in the top-k by cosine similarity"""
+    if not probes:
+        return 0.0
+    chunk_matrix = np.asarray(chunk_vectors, dtype=np.float32)
+    chunk_matrix /= np.linalg.norm(chunk_matrix, axis=1, keepdims=True) + 1e-12
+    hits = 0
+    for probe, vector in zip(probes, probe_vectors):
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        top = np.argsort(-(chunk_matrix @ query))[:k]
+        if any(probe in chunks[i] for i in top):
+            hits += 1
+    return hits / len(probes)
+
+
+def run(paths, k, n_probes):
+    rag = RAGSystem()
+    tokenizer = get_embedding_tokenizer()
+    processors = {
+        "chars": DocumentProcessor(chunking_mode="chars"),
+        "tokens": DocumentProcessor(chunking_mode="tokens"),
+    }
+
+    print(f"{'file':<40} {'mode':<7} {'chunks':>6} {'lost_tok':>8} {'embed_s':>8} {f'recall@{k}':>9}")
+    for path in paths:
+        text, _ = processors["chars"].load_pdf(path)
+        probes = sample_probes(text, n_probes)
+        probe_vectors = rag.embeddings.embed_documents(probes) if probes else []
+
+        for mode, processor in processors.items():
+            chunks = processor.chunk_documents(text, "pitch_deck")
+
+            start = time.perf_counter()
+            vectors = rag.embeddings.embed_documents(chunks)
+            embed_seconds = time.perf_counter() - start
+
+            recall = recall_at_k(chunks, vectors, probes, probe_vectors, k)
+            lost = truncated_tokens(chunks, tokenizer)
+            name = path if len(path) <= 40 else "..." + path[-37:]
+            print(f"{name:<40} {mode:<7} {len(chunks):>6} {lost:>8} {embed_seconds:>8.2f} {recall:>9.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=DEFAULT_FIXTURES)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--probes", type=int, default=40)
+    args = parser.parse_args(argv)
+    run(args.paths, args.k, args.probes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
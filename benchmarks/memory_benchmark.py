@@ -0,0 +1,94 @@
+"""
+Compare memory held by chunked documents: duplicated strings vs offset views.
+
+"strings" rebuilds the previous representation (full document text, a
+list of overlapping chunk strings and per-chunk metadata dicts); "views"
+is the SourceDocument model (one buffer, __slots__ chunk views). Both are
+built from the same already-loaded pages and measured with tracemalloc:
+memory still held afterwards and peak while building, also as a multiple
+of the raw text size.
+
+Usage:
+    python -m benchmarks.memory_benchmark [pdf ...] [--copies 20]
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from services.document_model import PAGE_SEPARATOR
+from services.document_processor import DocumentProcessor, _slide_title
+
+DEFAULT_FIXTURES = ["uploads/Pitch-Example-Air-BnB-PDF.pdf"]
+
+
+def build_strings(processor, pages):
+    """The previous representation: text + chunk strings + chunk_metadata"""
+    text = PAGE_SEPARATOR.join(page.page_content for page in pages)
+    chunks = []
+    chunk_metadata = []
+    for page in pages:
+        page_text = page.page_content
+        provenance = {"page_number": page.metadata["page_number"], "slide_title": _slide_title(page_text)}
+        position = 0
+        for chunk in processor.chunk_documents(page_text, "pitch_deck"):
+            start = max(page_text.find(chunk, position), position)
+            chunks.append(chunk)
+            chunk_metadata.append({**provenance, "char_start": start, "char_end": start + len(chunk)})
+            position = start + 1
+    return {"text": text, "chunks": chunks, "chunk_metadata": chunk_metadata}
+
+
+def build_views(processor, pages):
+    return processor.build_document(pages, "pitch_deck", "benchmark.pdf")
+
+
+def measure(build, *args):
+    """(bytes still held by the result, peak bytes while building)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held, peak
+
+
+def run(paths, copies):
+    processor = DocumentProcessor()
+
+    print(f"{'file':<40} {'layout':<10} {'repr':<8} {'raw_MB':>7} {'held_MB':>8} {'x_raw':>6} {'peak_MB':>8}")
+    for path in paths:
+        _, pages = processor.load_pdf(path)
+        page_type = type(pages[0])
+        layouts = {
+            # A data room of `copies` decks, each page a distinct string object
+            "deck": [page_type(page_content=page.page_content + f" [{i}]", metadata=page.metadata)
+                     for i in range(copies) for page in pages],
+            # A long single-page document such as a call transcript
+            "transcript": [page_type(
+                page_content=" ".join(page.page_content for page in pages * copies),
+                metadata={"page_number": 1}
+            )],
+        }
+
+        name = path if len(path) <= 40 else "..." + path[-37:]
+        for layout, layout_pages in layouts.items():
+            raw = sum(len(page.page_content.encode("utf-8")) for page in layout_pages)
+            for label, build in (("strings", build_strings), ("views", build_views)):
+                held, peak = measure(build, processor, layout_pages)
+                print(f"{name:<40} {layout:<10} {label:<8} {raw / 2**20:>7.2f} {held / 2**20:>8.2f} "
+                      f"{held / raw:>6.2f} {peak / 2**20:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=DEFAULT_FIXTURES)
+    parser.add_argument("--copies", type=int, default=20)
+    args = parser.parse_args(argv)
+    run(args.paths, args.copies)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Compare PDF text-extraction engines on a fixture set.
+
+Reports, per file and engine: pages per second (best of --repeat runs) and
+text fidelity as token-level F1 against a reference. The reference is
+"<fixture>.txt" next to the PDF when present, otherwise the pypdf output.
+
+Usage:
+    python -m benchmarks.pdf_engine_benchmark [pdf ...] [--repeat 3]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from collections import Counter
+
+from services.pdf_engines import PDF_ENGINES, get_pdf_engine
+from services.lexical_index import tokenize
+
+DEFAULT_FIXTURES = sorted(glob.glob("uploads/*.pdf"))
+
+
+def token_f1(candidate, reference):
+    """Bag-of-tokens F1 between two texts (1.0 = same words, same counts)"""
+    cand, ref = Counter(tokenize(candidate)), Counter(tokenize(reference))
+    overlap = sum((cand & ref).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(cand.values())
+    recall = overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def extract(engine, data):
+    return list(engine.extract_pages(io.BytesIO(data)))
+
+
+def run(paths, repeat):
+    print(f"{'file':<40} {'engine':<7} {'pages':>5} {'pages/s':>9} {'fidelity':>8}")
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        truth_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(truth_path):
+            with open(truth_path, encoding="utf-8") as f:
+                reference = f.read()
+        else:
+            reference = "\n".join(text for _, text in extract(get_pdf_engine("pypdf"), data))
+
+        for name in PDF_ENGINES:
+            engine = get_pdf_engine(name)
+            if engine.name != name:
+                continue  # backend not installed
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                pages = extract(engine, data)
+                best = min(best, time.perf_counter() - start)
+
+            text = "\n".join(page_text for _, page_text in pages)
+            label = path if len(path) <= 40 else "..." + path[-37:]
+            print(f"{label:<40} {name:<7} {len(pages):>5} {len(pages) / best:>9.1f} {token_f1(text, reference):>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    run(args.paths, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
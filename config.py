@@ -1,3 +1,4 @@
+import os
 
 # Gemini API Key
 GEMINI_API_KEY = "YOUR_GEMINI_API_KEY_HERE"
@@ -10,5 +11,85 @@ SEARCH_ENGINE_ID = "YOUR_SEARCH_ENGINE_ID_HERE"
 UPLOAD_FOLDER = "uploads"
 CHROMA_DB_PATH = "./chroma_db"
 
+# Keep a content-addressed copy of every upload (uploads/<sha256>.<ext>); parsing never needs it
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "false").lower() == "true"
+
 # HuggingFace Token (for embeddings)
 HF_TOKEN = "YOUR_HUGGINGFACE_TOKEN_HERE"
+
+# PDF text extraction backend: "pypdf" or "pdfium" (services/pdf_engines.py)
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pypdf")
+
+# OCR fallback for pages with no text layer (needs the tesseract binary + pytesseract)
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_MIN_CHARS = 20
+OCR_DPI = 200
+OCR_LANG = "eng"
+OCR_MAX_WORKERS = os.cpu_count() or 2
+OCR_DEADLINE_SECONDS = int(os.getenv("OCR_DEADLINE_SECONDS", "120"))
+OCR_CACHE_DIR = "./data/ocr_cache"
+# Not fork: the app process has threads (Streamlit, agents) that a forked worker would inherit mid-state
+OCR_START_METHOD = os.getenv("OCR_START_METHOD", "forkserver")
+
+# Parse every upload in a separate worker process with a wall-clock deadline and memory ceiling
+PARSE_SANDBOX = os.getenv("PARSE_SANDBOX", "true").lower() == "true"
+PARSE_DEADLINE_SECONDS = int(os.getenv("PARSE_DEADLINE_SECONDS", "60"))
+PARSE_MEMORY_LIMIT_MB = int(os.getenv("PARSE_MEMORY_LIMIT_MB", "2048"))
+PARSE_START_METHOD = os.getenv("PARSE_START_METHOD", "forkserver")
+
+# Analysis SLA: overall deadline and per-agent time budgets (seconds). An agent
+# that runs past its budget is replaced by its default output, flagged degraded
+ANALYSIS_DEADLINE_SECONDS = int(os.getenv("ANALYSIS_DEADLINE_SECONDS", "180"))
+AGENT_TIME_BUDGETS = {
+    "data_extraction": 45,
+    "market_research": 40,
+    "benchmarking": 40,
+    "risk_detection": 50,
+    "growth": 40,
+    "recommendation": 45,
+}
+# Time held back from the other agents so the recommendation always runs
+RECOMMENDATION_RESERVE_SECONDS = 20
+
+# LLM backend for the agents: "gemini", or "stub" for offline runs (answers match each agent's response schema)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Per-request timeouts for Gemini calls and web searches (connect, read)
+LLM_TIMEOUT_SECONDS = int(os.getenv("LLM_TIMEOUT_SECONDS", "40"))
+SEARCH_TIMEOUT_SECONDS = (3.05, 5)
+
+# Hedged Gemini requests (opt-in): a call still running after LLM_HEDGE_PERCENTILE
+# of the model's last LLM_LATENCY_WINDOW latencies gets a duplicate request, and
+# the first response wins; at most LLM_HEDGE_MAX_RATE of recent requests are hedged
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = 95
+LLM_HEDGE_MAX_RATE = 0.1
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_WINDOW = 200
+
+# Circuit breaker per external dependency (services/circuit_breaker.py): opens when
+# failure_rate_threshold of the last window_size calls failed (min_calls at least),
+# fails fast for open_seconds, then lets half_open_max_calls trial calls through
+CIRCUIT_BREAKERS = {
+    "gemini": {"failure_rate_threshold": 0.5, "window_size": 20, "min_calls": 4, "open_seconds": 30},
+    "hf_embeddings": {"failure_rate_threshold": 0.5, "window_size": 20, "min_calls": 4, "open_seconds": 30},
+    "google_search": {"failure_rate_threshold": 0.5, "window_size": 10, "min_calls": 3, "open_seconds": 60},
+}
+
+# Embedding model and its real input window (word-pieces, incl. [CLS]/[SEP])
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MAX_TOKENS = 256
+
+# Chunking: "chars" (1000/200 character splitter) or "tokens" (sized to the embedding window)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars")
+
+# Token overlap per document type when CHUNKING_MODE == "tokens"
+CHUNK_OVERLAP_TOKENS = {
+    "pitch_deck": 24,
+    "transcripts": 48,
+    "emails": 16,
+    "updates": 24,
+}
+
+# Email archives (.eml/.mbox) are indexed in groups of this many messages as they are parsed
+EMAIL_GROUP_MESSAGES = int(os.getenv("EMAIL_GROUP_MESSAGES", "200"))
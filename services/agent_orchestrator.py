@@ -4,7 +4,15 @@ from services.agents.risk_detection_agent import RiskDetectionAgent
 from services.agents.market_research_agent import MarketResearchAgent
 from services.agents.growth_agent import GrowthAgent
 from services.agents.recommendation_agent import RecommendationAgent
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from collections import defaultdict
 import os
+import threading
+import time
+from services.circuit_breaker import breaker_metrics
+from services.llm_client import hedging_metrics
+from services.json_repair import repair_stats
+from config import ANALYSIS_DEADLINE_SECONDS, AGENT_TIME_BUDGETS, RECOMMENDATION_RESERVE_SECONDS
 
 class AgentOrchestrator:
     """Coordinates all agents in the analysis pipeline"""
@@ -20,8 +28,32 @@ class AgentOrchestrator:
         self.growth_agent = GrowthAgent(rag_system)
         self.recommendation_agent = RecommendationAgent()
     
-    def analyze_startup(self, startup_id):
-        """Run complete 6-agent analysis pipeline"""
+    def analyze_startup(self, startup_id, readiness=None, deadline_seconds=ANALYSIS_DEADLINE_SECONDS):
+        """
+        Run complete 6-agent analysis pipeline
+        
+        Args:
+            startup_id: unique identifier for this startup
+            readiness: optional object whose wait(doc_types) blocks until those
+                document types are indexed (IngestionPipeline). Agents that
+                only need the pitch deck start as soon as it is indexed, the
+                others wait for the documents they declare in REQUIRED_DOC_TYPES.
+                Without it every document is assumed to be indexed already.
+            deadline_seconds: SLA for the whole analysis. Each agent also has
+                its own budget (AGENT_TIME_BUDGETS, counted once its documents
+                are indexed);
+                an agent past either gets its default output flagged degraded,
+                listed with the reason in results["degraded"]. The
+                recommendation always runs, with at least
+                RECOMMENDATION_RESERVE_SECONDS.
+        
+        Every agent's RETRIEVAL_QUESTIONS are embedded together up front,
+        while ingestion is still running, then resolved with one batched
+        vector search per readiness stage (agents sharing REQUIRED_DOC_TYPES)
+        and handed to the agents as contexts. An agent with a
+        retrieval_questions(startup_id) method can narrow its questions
+        once its documents are indexed.
+        """
         
         print("\n" + "="*60)
         print("🚀 STARTING MULTI-AGENT ANALYSIS (6 AGENTS)")
@@ -29,44 +61,202 @@ class AgentOrchestrator:
         
         results = {
             "startup_id": startup_id,
-            "status": "processing"
+            "status": "processing",
+            "agent_timings": {},
+            "degraded": []
         }
+        started = time.perf_counter()
+        sla_deadline = started + deadline_seconds
+        
+        retrieving_agents = {
+            "data_extraction": self.data_agent,
+            "benchmarking": self.benchmark_agent,
+            "risk_detection": self.risk_agent,
+            "growth": self.growth_agent,
+        }
+        
+        # The questions don't depend on the documents: embed all of them once, before waiting
+        try:
+            question_vectors = self.rag.embed_questions(
+                spec["question"]
+                for agent in retrieving_agents.values()
+                for spec in agent.RETRIEVAL_QUESTIONS.values()
+            )
+        except Exception as e:
+            print(f"⚠️ Question embedding failed, agents will embed on demand: {e}")
+            question_vectors = {}
+        
+        stage_contexts = {}
+        stage_locks = defaultdict(threading.Lock)
+        stage_locks_guard = threading.Lock()
+        
+        def stage_of(agent):
+            return None if readiness is None else frozenset(agent.REQUIRED_DOC_TYPES)
+        
+        def questions_of(agent):
+            if hasattr(agent, "retrieval_questions"):
+                return agent.retrieval_questions(startup_id)
+            return agent.RETRIEVAL_QUESTIONS
+        
+        def get_contexts(name):
+            # First agent of a readiness stage resolves the questions of every agent in it
+            stage = stage_of(retrieving_agents[name])
+            with stage_locks_guard:
+                stage_lock = stage_locks[stage]
+            with stage_lock:
+                if stage not in stage_contexts:
+                    specs = {
+                        (agent_name, key): spec
+                        for agent_name, agent in retrieving_agents.items() if stage_of(agent) == stage
+                        for key, spec in questions_of(agent).items()
+                    }
+                    stage_contexts[stage] = self.rag.query_batch(specs, startup_id, question_vectors)
+            return {key: context for (agent_name, key), context in stage_contexts[stage].items() if agent_name == name}
+        
+        def run_agent(name, agent, method, body_started, *args):
+            # Wait for the agent's documents, then run it; its budget starts once the documents are ready
+            try:
+                if readiness is not None:
+                    readiness.wait(agent.REQUIRED_DOC_TYPES)
+            finally:
+                body_started["at"] = time.perf_counter()
+                body_started["event"].set()
+            if name in retrieving_agents:
+                output = method(*args, contexts=get_contexts(name))
+            else:
+                output = method(*args)
+            results["agent_timings"].setdefault(name, round(time.perf_counter() - started, 2))
+            return output
+        
+        # Threads can't be stopped: an agent past its budget is abandoned and its late result
+        # dropped. One worker per agent, so an abandoned agent never holds up a later one
+        pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="agent")
+        
+        def launch(name, agent, method, *args):
+            body_started = {"at": None, "event": threading.Event()}
+            return name, pool.submit(run_agent, name, agent, method, body_started, *args), body_started
+        
+        def collect(launched, fallback):
+            # Result of a launched agent, or fallback() flagged degraded once its budget runs out
+            name, future, body_started = launched
+            budget = AGENT_TIME_BUDGETS.get(name, deadline_seconds)
+            if name == "recommendation":
+                sla_end = max(sla_deadline, time.perf_counter() + RECOMMENDATION_RESERVE_SECONDS)
+            else:
+                sla_end = sla_deadline - RECOMMENDATION_RESERVE_SECONDS
+            
+            try:
+                # Waiting for documents only counts against the analysis deadline
+                if not body_started["event"].wait(timeout=max(0.0, sla_end - time.perf_counter())):
+                    raise FuturesTimeout()
+                budget_end = min(body_started["at"] + budget, sla_end)
+                output = future.result(timeout=max(0.0, budget_end - time.perf_counter()))
+                # Marker only: the outputs are serialized into later agents' prompts
+                repair = output.pop("_repair", None)
+                if repair:
+                    # Answered, but part of the response was lost and filled with neutral values
+                    reason = f"model response {repair}, lost fields filled with neutral values"
+                    print(f"⚠️ {name} degraded ({reason})")
+                    results["degraded"].append({"agent": name, "reason": reason})
+                return output
+            except FuturesTimeout:
+                future.cancel()
+                if not body_started["event"].is_set():
+                    reason = f"documents not indexed within the {deadline_seconds}s analysis deadline"
+                elif body_started["at"] + budget <= sla_end:
+                    reason = f"exceeded its {budget}s time budget"
+                else:
+                    reason = f"ran into the {deadline_seconds}s analysis deadline"
+            except Exception as e:
+                reason = f"failed: {e}"
+            
+            print(f"⚠️ {name} degraded ({reason}), using default output")
+            results["agent_timings"].setdefault(name, round(time.perf_counter() - started, 2))
+            results["degraded"].append({"agent": name, "reason": reason})
+            output = fallback()
+            output["degraded"] = True
+            output["degraded_reason"] = reason
+            return output
         
         try:
-            # Agent 1: Extract Data
-            extracted_data = self.data_agent.extract(startup_id)
+            # Agent 1: Extract Data (pitch deck only)
+            extracted_data = collect(
+                launch("data_extraction", self.data_agent, self.data_agent.extract, startup_id),
+                self.data_agent._get_default_structure
+            )
             results["extracted_data"] = extracted_data
+            self.rag.update_startup_profile(startup_id, extracted_data.get('company_info', {}))
+            sector = extracted_data.get('company_info', {}).get('sector') or 'Unknown'
+            stage = extracted_data.get('company_info', {}).get('stage') or 'Seed'
+            
+            # Agents 2-4 run side by side, each as soon as its documents are indexed
+            market_launch = launch(
+                "market_research", self.market_agent, self.market_agent.research,
+                startup_id, extracted_data
+            )
+            benchmark_launch = launch(
+                "benchmarking", self.benchmark_agent, self.benchmark_agent.benchmark,
+                startup_id, extracted_data
+            )
+            risk_launch = launch(
+                "risk_detection", self.risk_agent, self.risk_agent.detect_risks,
+                startup_id, extracted_data
+            )
             
             # Agent 2: Benchmarking
-            benchmark_data = self.benchmark_agent.benchmark(startup_id, extracted_data)
+            benchmark_data = collect(
+                benchmark_launch,
+                lambda: self.benchmark_agent._get_default_structure(sector, stage)
+            )
             results["benchmark_data"] = benchmark_data
             
+            # Agent 5: Growth Assessment (needs the benchmark and every document)
+            growth_assessment = collect(
+                launch(
+                    "growth", self.growth_agent, self.growth_agent.assess_growth,
+                    startup_id, extracted_data, benchmark_data
+                ),
+                self.growth_agent._get_default_structure
+            )
+            results["growth_assessment"] = growth_assessment
+            
             # Agent 3: Detect Risks
-            risk_analysis = self.risk_agent.detect_risks(startup_id, extracted_data)
+            risk_analysis = collect(risk_launch, self.risk_agent._get_default_structure)
             results["risk_analysis"] = risk_analysis
             
             # Agent 4: Market Research
-            market_research = self.market_agent.research(startup_id, extracted_data)
+            market_research = collect(market_launch, self.market_agent._get_default_structure)
             results["market_research"] = market_research
             
-            # Agent 5: Growth Assessment
-            growth_assessment = self.growth_agent.assess_growth(
-                startup_id,
-                extracted_data,
-                benchmark_data
-            )
-            results["growth_assessment"] = growth_assessment
-            
-            # Agent 6: Generate Recommendation
-            recommendation = self.recommendation_agent.generate_recommendation(
-                extracted_data,
-                risk_analysis,
-                market_research,
-                benchmark_data,
-                growth_assessment
+            # Agent 6: Generate Recommendation (always produced, from whatever the others returned)
+            recommendation = collect(
+                launch(
+                    "recommendation", self.recommendation_agent, self.recommendation_agent.generate_recommendation,
+                    extracted_data,
+                    risk_analysis,
+                    market_research,
+                    benchmark_data,
+                    growth_assessment
+                ),
+                self.recommendation_agent._get_default_structure
             )
             results["recommendation"] = recommendation
             
+            # Nearest previously analysed startups (centroid index)
+            results["similar_startups"] = self.rag.similar_startups(startup_id)
+            
+            # Chunk counts from ingest, including the near-duplicate ratio
+            results["ingest_stats"] = self.rag.ingest_stats.get(startup_id, {})
+            
+            # State of the Gemini / embeddings / search breakers (open ones were skipped)
+            results["circuit_breakers"] = breaker_metrics()
+            
+            # Gemini latency percentile and hedge counts per model
+            results["llm_hedging"] = hedging_metrics()
+            
+            # Clean / repaired / salvaged / failed JSON responses per agent
+            results["json_repair"] = repair_stats()
+            
             results["status"] = "complete"
             
             print("\n" + "="*60)
@@ -81,3 +271,6 @@ class AgentOrchestrator:
             results["error"] = str(e)
 
             return results
+        
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,21 +1,77 @@
-import google.generativeai as genai
 import os
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from config import SEARCH_TIMEOUT_SECONDS
+from services.circuit_breaker import get_breaker
+from services.llm_client import GeminiClient
+from services.llm_schema import array, number, obj, string
+from services.metric_timeline import format_timeline, headline_growth
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GOOGLE_SEARCH_API_KEY= os.getenv('GOOGLE_SEARCH_API_KEY')
 SEARCH_ENGINE_ID= os.getenv('SEARCH_ENGINE_ID')
 
+ABOVE_AVERAGE_STATUSES = ["Above Average", "Average", "Below Average", "Unknown"]
+
+
+def _comparison(statuses, with_percentile=True):
+    """Schema of one startup-vs-sector comparison"""
+    properties = {"startup_value": string(), "sector_average": string()}
+    if with_percentile:
+        properties["percentile"] = number(nullable=True)
+    properties["status"] = string(enum=statuses)
+    properties["notes"] = string()
+    return obj(properties)
+
+
 class BenchmarkingAgent:
     """Agent to benchmark startup against industry peers"""
     
+    # Documents that must be indexed before this agent runs (updates feed the CMGR)
+    REQUIRED_DOC_TYPES = ("pitch_deck", "update")
+    
+    # Retrieval questions, resolved up front in one batched pass (RAGSystem.query_batch)
+    RETRIEVAL_QUESTIONS = {
+        "metrics": {
+            "question": "What are all the metrics: revenue, MRR, growth rate, team size, customers?",
+            "n_results": 5
+        },
+    }
+    
+    # Structured output requested from the model (services/llm_schema.py)
+    RESPONSE_SCHEMA = obj({
+        "sector_benchmarks": obj({
+            "sector": string(),
+            "stage": string(),
+            "avg_revenue_seed": string(),
+            "avg_growth_rate": string(),
+            "avg_team_size": string(),
+            "avg_valuation_multiple": string()
+        }),
+        "comparisons": obj({
+            "revenue": _comparison(ABOVE_AVERAGE_STATUSES),
+            "growth_rate": _comparison(ABOVE_AVERAGE_STATUSES),
+            "team_size": _comparison(["Appropriate", "Too Large", "Too Small", "Unknown"], with_percentile=False),
+            "customer_count": _comparison(ABOVE_AVERAGE_STATUSES),
+            "revenue_per_employee": _comparison(["Efficient", "Average", "Inefficient", "Unknown"], with_percentile=False)
+        }),
+        "competitive_position": obj({
+            "overall_ranking": string(enum=["Top 25%", "Top 50%", "Bottom 50%", "Bottom 25%", "Unknown"]),
+            "key_advantages": array(string()),
+            "key_gaps": array(string()),
+            "catch_up_difficulty": string(enum=["Easy", "Moderate", "Difficult", "Very Difficult", "Unknown"])
+        }),
+        "benchmark_score": number(),
+        "summary": string()
+    })
+    
     def __init__(self, rag_system):
         self.rag = rag_system
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model = GeminiClient('gemini-2.5-flash-lite', agent="benchmarking")
     
-    def benchmark(self, startup_id, extracted_data):
-        """Benchmark startup against sector peers"""
+    def benchmark(self, startup_id, extracted_data, contexts=None):
+        """Benchmark startup against sector peers (contexts: RETRIEVAL_QUESTIONS resolved by the orchestrator)"""
         
         print("📊 Agent 2: Benchmarking against sector peers...")
         
@@ -30,17 +86,19 @@ class BenchmarkingAgent:
             f"{sector} seed stage revenue benchmarks"
         ]
         
-        benchmark_data = []
-        for query in benchmark_queries:
-            results = self._google_search(query, num_results=3)
-            benchmark_data.extend(results)
+        # Searches run side by side, so the slowest one bounds the wait
+        with ThreadPoolExecutor(max_workers=len(benchmark_queries)) as pool:
+            search_results = list(pool.map(lambda query: self._google_search(query, num_results=3), benchmark_queries))
+        benchmark_data = [item for results in search_results for item in results]
         
         # Get startup metrics from RAG
-        metrics_context = self.rag.query(
-            "What are all the metrics: revenue, MRR, growth rate, team size, customers?",
-            startup_id,
-            n_results=5
-        )
+        if contexts is None:
+            contexts = self.rag.query_batch(self.RETRIEVAL_QUESTIONS, startup_id)
+        metrics_context = contexts["metrics"]
+        
+        # Growth rate computed from dated update metrics (CMGR) rather than inferred
+        timeline = self.rag.get_metric_timeline(startup_id)
+        computed_growth = headline_growth(timeline)
         
         prompt = f"""
 You are a venture capital benchmarking analyst.
@@ -59,6 +117,9 @@ Customers: {extracted_data.get('metrics', {}).get('customers', 'Unknown')}
 METRICS CONTEXT FROM DOCUMENTS:
 {metrics_context}
 
+METRIC TIMELINE FROM FOUNDER UPDATES (computed; use its CMGR as the startup's growth rate):
+{format_timeline(timeline)}
+
 INDUSTRY BENCHMARK DATA (from web search):
 {json.dumps(benchmark_data, indent=2)}
 
@@ -127,26 +188,24 @@ Guidelines:
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            data = json.loads(response_text)
+            data = self._apply_computed_growth(
+                self.model.generate_json(
+                    prompt, self.RESPONSE_SCHEMA, self._get_default_structure(sector, stage)
+                ), computed_growth
+            )
             
             print(f"✅ Benchmarking complete! Score: {data.get('benchmark_score', 'N/A')}/100")
             return data
             
         except Exception as e:
             print(f"❌ Error in benchmarking: {e}")
-            return self._get_default_structure(sector, stage)
+            return self._apply_computed_growth(self._get_default_structure(sector, stage), computed_growth)
+    
+    def _apply_computed_growth(self, data, computed_growth):
+        """Use the locally computed CMGR as the startup's growth rate when updates provide one"""
+        if computed_growth:
+            data.setdefault("comparisons", {}).setdefault("growth_rate", {})["startup_value"] = computed_growth
+        return data
     
     def _google_search(self, query, num_results=3):
         """Search Google for benchmark data"""
@@ -163,7 +222,10 @@ Guidelines:
                 'num': num_results
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            # Fails fast while Google Search keeps failing (HTTP errors count as failures)
+            with get_breaker("google_search").guard():
+                response = requests.get(url, params=params, timeout=SEARCH_TIMEOUT_SECONDS)
+                response.raise_for_status()
             results = response.json()
             
             if 'items' in results:
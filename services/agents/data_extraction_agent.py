@@ -1,57 +1,139 @@
-import google.generativeai as genai
 import os
-import json
+from services.metric_extractor import prefill_fields, format_facts_table
+from services.llm_client import GeminiClient
+from services.llm_schema import array, integer, number, obj, string
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
 class DataExtractionAgent:
     """Agent to extract structured data from documents"""
     
+    # Documents that must be indexed before this agent runs
+    REQUIRED_DOC_TYPES = ("pitch_deck",)
+    
+    # Retrieval questions, resolved up front in one batched pass (RAGSystem.query_batch)
+    RETRIEVAL_QUESTIONS = {
+        "company": {
+            "question": "What is the company name, sector, industry, and location?",
+            "n_results": 3
+        },
+        "business": {
+            "question": "What problem are they solving? What is their solution? Who are their target customers? What is their business model?",
+            "n_results": 5
+        },
+        "metrics": {
+            "question": "What are the financial metrics: revenue, MRR, ARR, growth rate, customers, burn rate, runway?",
+            "n_results": 5
+        },
+        "team": {
+            "question": "Who are the founders? What is the team size? What is their experience?",
+            "n_results": 3,
+            "slide_keywords": ["team", "founder", "leadership"]
+        },
+        "market": {
+            "question": "What is the market size? TAM, SAM, SOM? Market opportunity?",
+            "n_results": 3
+        },
+        "funding": {
+            "question": "How much funding have they raised? From which investors? What round?",
+            "n_results": 3
+        },
+    }
+    
+    # Metric fields known from the numeric facts at which the "metrics" question is not retrieved
+    METRIC_FACTS_SUFFICIENT = 3
+    
+    # Structured output requested from the model (services/llm_schema.py)
+    RESPONSE_SCHEMA = obj({
+        "company_info": obj({
+            "name": string(),
+            "sector": string(),
+            "stage": string(),
+            "founded_year": integer(nullable=True),
+            "location": string()
+        }),
+        "business": obj({
+            "problem": string(),
+            "solution": string(),
+            "target_market": string(),
+            "business_model": string(),
+            "unique_value_prop": string(),
+            "market_size_tam": string()
+        }),
+        "metrics": obj({
+            "mrr": number(nullable=True),
+            "arr": number(nullable=True),
+            "revenue": number(nullable=True),
+            "growth_rate_monthly": string(nullable=True),
+            "customers": number(nullable=True),
+            "burn_rate_monthly": number(nullable=True),
+            "runway_months": number(nullable=True),
+            "churn_rate": string(nullable=True)
+        }),
+        "team": obj({
+            "founders": array(string()),
+            "total_employees": integer(nullable=True),
+            "key_hires": array(string())
+        }),
+        "funding": obj({
+            "total_raised": number(nullable=True),
+            "last_round": string(nullable=True),
+            "last_round_amount": number(nullable=True),
+            "investors": array(string())
+        }),
+        "traction": obj({
+            "product_status": string(enum=["Idea", "MVP", "Beta", "Live", "Scaling", "Unknown"]),
+            "customer_examples": array(string()),
+            "partnerships": array(string()),
+            "awards": array(string())
+        })
+    })
+    
     def __init__(self, rag_system):
         self.rag = rag_system
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model = GeminiClient('gemini-2.5-flash-lite', agent="data_extraction")
     
-    def extract(self, startup_id):
-        """Extract all structured data"""
-        
-        print("🔍 Agent 1: Extracting structured data...")
+    def retrieval_questions(self, startup_id):
+        """RETRIEVAL_QUESTIONS worth a vector search: "metrics" is left out when the numeric facts answer it"""
+        if self._facts_cover_metrics(prefill_fields(self.rag.get_metric_facts(startup_id))):
+            return {key: spec for key, spec in self.RETRIEVAL_QUESTIONS.items() if key != "metrics"}
+        return self.RETRIEVAL_QUESTIONS
+    
+    def _facts_cover_metrics(self, prefilled):
+        return len(prefilled.get('metrics', {})) >= self.METRIC_FACTS_SUFFICIENT
+    
+    def extract(self, startup_id, contexts=None):
+        """
+        Extract all structured data
         
-        # Query RAG for different information
-        company_context = self.rag.query(
-            "What is the company name, sector, industry, and location?",
-            startup_id,
-            n_results=3
-        )
+        Args:
+            startup_id: unique identifier for this startup
+            contexts: retrieval_questions() already resolved by the orchestrator
+                (fetched here in one batch when missing)
+        """
         
-        business_context = self.rag.query(
-            "What problem are they solving? What is their solution? Who are their target customers? What is their business model?",
-            startup_id,
-            n_results=5
-        )
+        print("🔍 Agent 1: Extracting structured data...")
         
-        metrics_context = self.rag.query(
-            "What are the financial metrics: revenue, MRR, ARR, growth rate, customers, burn rate, runway?",
-            startup_id,
-            n_results=5
-        )
+        # Literal numeric facts (ARR, burn, runway, ...) found locally at ingest
+        facts = self.rag.get_metric_facts(startup_id)
+        prefilled = prefill_fields(facts)
+        facts_table = format_facts_table(facts) or "None found"
         
-        team_context = self.rag.query(
-            "Who are the founders? What is the team size? What is their experience?",
-            startup_id,
-            n_results=3
-        )
+        # Retrieved context for each question
+        if contexts is None:
+            contexts = self.rag.query_batch(self.retrieval_questions(startup_id), startup_id)
+        company_context = contexts["company"]
+        business_context = contexts["business"]
         
-        market_context = self.rag.query(
-            "What is the market size? TAM, SAM, SOM? Market opportunity?",
-            startup_id,
-            n_results=3
-        )
+        # The facts table already answers most metric questions; retrieval is only used when it is thin
+        if self._facts_cover_metrics(prefilled) or "metrics" not in contexts:
+            metrics_context = "See PRE-EXTRACTED NUMERIC FACTS"
+        else:
+            metrics_context = contexts["metrics"]
         
-        funding_context = self.rag.query(
-            "How much funding have they raised? From which investors? What round?",
-            startup_id,
-            n_results=3
-        )
+        team_context = contexts["team"]
+        market_context = contexts["market"]
+        funding_context = contexts["funding"]
         
         # Combine all contexts
         full_context = f"""
@@ -72,6 +154,9 @@ MARKET:
 
 FUNDING:
 {funding_context}
+
+PRE-EXTRACTED NUMERIC FACTS (literal values found in the documents):
+{facts_table}
 """
         
         prompt = f"""
@@ -129,6 +214,7 @@ Return this EXACT JSON structure:
 }}
 
 Rules:
+- Use the PRE-EXTRACTED NUMERIC FACTS for the matching fields
 - Use null for missing numbers
 - Use "Unknown" or "Not stated" for missing text
 - Extract exact values when available
@@ -137,26 +223,20 @@ Rules:
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON response
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            data = json.loads(response_text)
+            data = self.model.generate_json(prompt, self.RESPONSE_SCHEMA, self._get_default_structure())
             
             print("✅ Data extraction complete!")
-            return data
+            return self._apply_prefill(data, prefilled)
             
         except Exception as e:
             print(f"❌ Error in data extraction: {e}")
-            return self._get_default_structure()
+            return self._apply_prefill(self._get_default_structure(), prefilled)
+    
+    def _apply_prefill(self, data, prefilled):
+        """Set fields to the locally extracted literal values, over whatever the LLM returned"""
+        for section, values in prefilled.items():
+            data.setdefault(section, {}).update(values)
+        return data
     
     def _get_default_structure(self):
         """Default structure if extraction fails"""
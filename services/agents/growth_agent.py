@@ -1,48 +1,91 @@
-import google.generativeai as genai
-
 import json
 import os
+from services.metric_timeline import format_timeline
+from services.llm_client import GeminiClient
+from services.llm_schema import array, boolean, number, obj, string
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
+def _dimension(**extra):
+    """Schema of one scored growth dimension"""
+    return obj({"score": number(), "reasoning": string(), "evidence": array(string()), **extra})
+
+
 class GrowthAgent:
     """Agent to assess growth potential"""
     
+    # Documents that must be indexed before this agent runs
+    REQUIRED_DOC_TYPES = ("pitch_deck", "transcript", "email", "update")
+    
+    # Retrieval questions, resolved up front in one batched pass (RAGSystem.query_batch)
+    RETRIEVAL_QUESTIONS = {
+        "pmf": {
+            "question": "Evidence of product-market fit: customer feedback, retention, satisfaction, demand",
+            "n_results": 5
+        },
+        "moat": {
+            "question": "What makes the product unique? Competitive advantages? Technology? Patents? Network effects?",
+            "n_results": 5
+        },
+        "scale": {
+            "question": "Business model scalability? Unit economics? Expansion plans? International potential?",
+            "n_results": 5
+        },
+        "execution": {
+            "question": "Milestones achieved? Progress timeline? Execution speed? Team capabilities?",
+            "n_results": 5
+        },
+    }
+    
+    # Structured output requested from the model (services/llm_schema.py)
+    RESPONSE_SCHEMA = obj({
+        "growth_scores": obj({
+            "market_opportunity": _dimension(),
+            "competitive_moat": _dimension(
+                moat_type=string(enum=["Network Effects", "Technology", "Brand", "Data", "Switching Costs", "None"])
+            ),
+            "product_innovation": _dimension(
+                innovation_level=string(enum=["Breakthrough", "Significant", "Incremental", "Me-too"])
+            ),
+            "scalability": _dimension(bottlenecks=array(string())),
+            "team_execution": _dimension(key_strengths=array(string()), key_gaps=array(string()))
+        }),
+        "overall_growth_score": number(),
+        "growth_trajectory": string(enum=["Exponential", "Linear", "Stagnant", "Declining", "Unclear"]),
+        "time_to_scale": string(enum=["< 2 years", "2-4 years", "4+ years", "Unclear"]),
+        "exit_potential": obj({
+            "likely_outcome": string(enum=["IPO", "Acquisition", "Strategic Sale", "Other"]),
+            "estimated_timeline": string(),
+            "potential_acquirers": array(string()),
+            "exit_multiple_estimate": string()
+        }),
+        "growth_plan_quality": obj({
+            "score": number(),
+            "has_clear_strategy": boolean(),
+            "key_milestones": array(string()),
+            "risks_to_plan": array(string())
+        }),
+        "recommendation_summary": string()
+    })
+    
     def __init__(self, rag_system):
         self.rag = rag_system
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model = GeminiClient('gemini-2.5-flash-lite', agent="growth")
     
-    def assess_growth(self, startup_id, extracted_data, benchmark_data):
-        """Assess growth potential and scalability"""
+    def assess_growth(self, startup_id, extracted_data, benchmark_data, contexts=None):
+        """Assess growth potential and scalability (contexts: RETRIEVAL_QUESTIONS resolved by the orchestrator)"""
         
         print("🚀 Agent 5: Assessing growth potential...")
         
-        # Query for product and market fit evidence
-        pmf_context = self.rag.query(
-            "Evidence of product-market fit: customer feedback, retention, satisfaction, demand",
-            startup_id,
-            n_results=5
-        )
+        # Growth numbers come from arithmetic over dated update metrics, not from the LLM
+        timeline = self.rag.get_metric_timeline(startup_id)
         
-        # Query for competitive advantages
-        moat_context = self.rag.query(
-            "What makes the product unique? Competitive advantages? Technology? Patents? Network effects?",
-            startup_id,
-            n_results=5
-        )
-        
-        # Query for scalability
-        scale_context = self.rag.query(
-            "Business model scalability? Unit economics? Expansion plans? International potential?",
-            startup_id,
-            n_results=5
-        )
-        
-        # Query for execution capability
-        execution_context = self.rag.query(
-            "Milestones achieved? Progress timeline? Execution speed? Team capabilities?",
-            startup_id,
-            n_results=5
-        )
+        # Product-market fit, competitive advantages, scalability and execution evidence
+        if contexts is None:
+            contexts = self.rag.query_batch(self.RETRIEVAL_QUESTIONS, startup_id)
+        pmf_context = contexts["pmf"]
+        moat_context = contexts["moat"]
+        scale_context = contexts["scale"]
+        execution_context = contexts["execution"]
         
         prompt = f"""
 You are a growth strategy analyst for venture capital.
@@ -65,6 +108,9 @@ SCALABILITY:
 EXECUTION CAPABILITY:
 {execution_context}
 
+METRIC TIMELINE FROM FOUNDER UPDATES (computed, use these growth numbers as-is):
+{format_timeline(timeline)}
+
 Assess growth potential across 5 dimensions and return ONLY valid JSON:
 
 {{
@@ -129,26 +175,21 @@ Return ONLY JSON.
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            data = json.loads(response_text)
+            data = self._apply_timeline(self.model.generate_json(prompt, self.RESPONSE_SCHEMA, self._get_default_structure()), timeline)
             
             print(f"✅ Growth assessment complete! Overall score: {data.get('overall_growth_score', 'N/A')}/10")
             return data
             
         except Exception as e:
             print(f"❌ Error in growth assessment: {e}")
-            return self._get_default_structure()
+            return self._apply_timeline(self._get_default_structure(), timeline)
+    
+    def _apply_timeline(self, data, timeline):
+        """Attach the computed timeline; its CMGR overrides the LLM's trajectory guess"""
+        data["metric_timeline"] = timeline
+        if timeline["growth_trajectory"]:
+            data["growth_trajectory"] = timeline["growth_trajectory"]
+        return data
     
     def _get_default_structure(self):
         """Default structure when assessment fails"""
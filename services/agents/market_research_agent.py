@@ -1,7 +1,11 @@
-import google.generativeai as genai
 import os
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from config import SEARCH_TIMEOUT_SECONDS
+from services.circuit_breaker import get_breaker
+from services.llm_client import GeminiClient
+from services.llm_schema import array, boolean, integer, number, obj, string
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GOOGLE_SEARCH_API_KEY= os.getenv('GOOGLE_SEARCH_API_KEY')
@@ -10,9 +14,43 @@ SEARCH_ENGINE_ID= os.getenv('SEARCH_ENGINE_ID')
 class MarketResearchAgent:
     """Agent to validate claims with web research"""
     
+    # Documents that must be indexed before this agent runs
+    REQUIRED_DOC_TYPES = ("pitch_deck",)
+    
+    # Structured output requested from the model (services/llm_schema.py)
+    RESPONSE_SCHEMA = obj({
+        "validations": obj({
+            "market_size": obj({
+                "claimed": string(),
+                "found": string(),
+                "status": string(enum=["Verified", "Inflated", "Conservative", "Unable to verify"]),
+                "notes": string()
+            }),
+            "competitors": obj({
+                "claimed": string(),
+                "found": array(string()),
+                "status": string(enum=["Accurate", "Understated", "Overstated", "Unable to verify"]),
+                "notes": string()
+            }),
+            "company_presence": obj({
+                "found_online": boolean(),
+                "news_mentions": integer(),
+                "credibility": string(enum=["High", "Medium", "Low"]),
+                "notes": string()
+            })
+        }),
+        "market_insights": obj({
+            "market_trend": string(enum=["Growing", "Stable", "Declining", "Emerging", "Unknown"]),
+            "market_maturity": string(enum=["Nascent", "Growing", "Mature", "Saturated", "Unknown"]),
+            "opportunity_score": number(),
+            "notes": string()
+        }),
+        "credibility_score": number()
+    })
+    
     def __init__(self, rag_system):
         self.rag = rag_system
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model = GeminiClient('gemini-2.5-flash-lite', agent="market_research")
     
     def research(self, startup_id, extracted_data):
         """Conduct market research and validation"""
@@ -22,16 +60,14 @@ class MarketResearchAgent:
         company_name = extracted_data.get('company_info', {}).get('name', 'Unknown')
         sector = extracted_data.get('company_info', {}).get('sector', 'Unknown')
         
-        # Search for company
-        company_results = self._google_search(f"{company_name} startup")
-        
-        # Search for market size validation
-        market_query = f"{sector} market size 2024"
-        market_results = self._google_search(market_query)
-        
-        # Search for competitors
-        competitor_query = f"{sector} startups competitors"
-        competitor_results = self._google_search(competitor_query)
+        # Company, market size validation and competitor searches, side by side
+        queries = [
+            f"{company_name} startup",
+            f"{sector} market size 2024",
+            f"{sector} startups competitors"
+        ]
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            company_results, market_results, competitor_results = pool.map(self._google_search, queries)
         
         prompt = f"""
 You are a market research analyst.
@@ -86,19 +122,7 @@ Return ONLY JSON.
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            data = json.loads(response_text)
+            data = self.model.generate_json(prompt, self.RESPONSE_SCHEMA, self._get_default_structure())
             
             print("✅ Market research complete!")
             return data
@@ -122,7 +146,10 @@ Return ONLY JSON.
                 'num': num_results
             }
             
-            response = requests.get(url, params=params)
+            # Fails fast while Google Search keeps failing (HTTP errors count as failures)
+            with get_breaker("google_search").guard():
+                response = requests.get(url, params=params, timeout=SEARCH_TIMEOUT_SECONDS)
+                response.raise_for_status()
             results = response.json()
             
             if 'items' in results:
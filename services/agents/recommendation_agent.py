@@ -1,13 +1,31 @@
-import google.generativeai as genai
 import os
 import json
+from services.llm_client import GeminiClient
+from services.llm_schema import array, number, obj, string
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 class RecommendationAgent:
     """Agent to generate final investment recommendation"""
     
+    # Works from the other agents' outputs, so it never waits on ingestion
+    REQUIRED_DOC_TYPES = ()
+    
+    # Structured output requested from the model (services/llm_schema.py)
+    RESPONSE_SCHEMA = obj({
+        "decision": string(enum=["PASS", "MAYBE", "INVEST"]),
+        "confidence": number(),
+        "investment_thesis": string(),
+        "key_strengths": array(string()),
+        "key_concerns": array(string()),
+        "suggested_valuation": string(nullable=True),
+        "suggested_investment": string(nullable=True),
+        "follow_up_questions": array(string()),
+        "deal_score": number(),
+        "next_steps": string()
+    })
+    
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.5-flash-lite')
+        self.model = GeminiClient('gemini-2.5-flash-lite', agent="recommendation")
     
     def generate_recommendation(self, extracted_data, risk_analysis, market_research, benchmark_data, growth_assessment):
         """Generate final investment recommendation"""
@@ -107,19 +125,7 @@ Return ONLY JSON, no markdown formatting.
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-            
-            data = json.loads(response_text)
+            data = self.model.generate_json(prompt, self.RESPONSE_SCHEMA, self._get_default_structure())
             
             # Validate decision matches guidelines
             decision = data.get('decision', 'MAYBE')
@@ -140,25 +146,28 @@ Return ONLY JSON, no markdown formatting.
             import traceback
             traceback.print_exc()
             
-            return {
-                "decision": "MAYBE",
-                "confidence": 50,
-                "investment_thesis": "Unable to generate recommendation due to processing error. Manual review required.",
-                "key_strengths": ["Analysis data collected successfully"],
-                "key_concerns": [
-                    "Analysis incomplete - technical error occurred",
-                    f"Error: {str(e)}"
-                ],
-                "suggested_valuation": None,
-                "suggested_investment": None,
-                "follow_up_questions": [
-                    "Please rerun the analysis",
-                    "Verify all document uploads were successful",
-                    "Check system logs for detailed error information"
-                ],
-                "deal_score": 50,
-                "next_steps": "Manual review required - rerun analysis or review documents manually"
-
-            }
+            return self._get_default_structure(str(e))
+    
+    def _get_default_structure(self, error="processing error"):
+        """Neutral MAYBE recommendation used when the model fails or runs out of time"""
+        return {
+            "decision": "MAYBE",
+            "confidence": 50,
+            "investment_thesis": "Unable to generate recommendation due to processing error. Manual review required.",
+            "key_strengths": ["Analysis data collected successfully"],
+            "key_concerns": [
+                "Analysis incomplete - technical error occurred",
+                f"Error: {error}"
+            ],
+            "suggested_valuation": None,
+            "suggested_investment": None,
+            "follow_up_questions": [
+                "Please rerun the analysis",
+                "Verify all document uploads were successful",
+                "Check system logs for detailed error information"
+            ],
+            "deal_score": 50,
+            "next_steps": "Manual review required - rerun analysis or review documents manually"
+        }
 
 
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import CIRCUIT_BREAKERS
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one external dependency
+
+    closed: calls go through and their outcomes fill a sliding window; the
+        breaker opens once the window holds min_calls outcomes and the
+        failure rate reaches failure_rate_threshold.
+    open: calls fail immediately with CircuitOpenError for open_seconds.
+    half_open: up to half_open_max_calls trial calls go through; a success
+        closes the breaker, a failure opens it again.
+    """
+
+    def __init__(self, name, failure_rate_threshold=0.5, window_size=20, min_calls=4,
+                 open_seconds=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._window = deque(maxlen=window_size)
+        self._opened_at = None
+        self._trials = 0
+        self._lock = threading.Lock()
+
+        self._calls = 0
+        self._failures = 0
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        # Open -> half-open once the cool-down has passed (caller holds the lock)
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trials = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        print(f"🔌 Circuit '{self.name}' open, failing fast for {self.open_seconds}s")
+
+    def _failure_rate(self):
+        return self._window.count(False) / len(self._window) if self._window else 0.0
+
+    def allow(self):
+        """Whether a call may go through now (counts a rejection or a half-open trial)"""
+        return self._admit() is not None
+
+    def _admit(self):
+        # CLOSED or HALF_OPEN (a trial slot taken) when the call may go through, else None
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return CLOSED
+            if self._state == HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return HALF_OPEN
+            self._rejected += 1
+            return None
+
+    def _release_trial(self):
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._calls += 1
+            if self._state == HALF_OPEN:
+                print(f"✅ Circuit '{self.name}' closed again")
+                self._state = CLOSED
+                self._window.clear()
+            self._window.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._calls += 1
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._window.append(False)
+            if (self._state == CLOSED and len(self._window) >= self.min_calls
+                    and self._failure_rate() >= self.failure_rate_threshold):
+                self._open()
+
+    def _reject(self):
+        with self._lock:
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - (self._opened_at or 0)))
+        return CircuitOpenError(f"{self.name} circuit open, retry in {retry_in:.0f}s")
+
+    @contextmanager
+    def guard(self):
+        """
+        Run a block against the dependency, recording its outcome
+
+        e.g.
+            with breaker.guard():
+                response = requests.get(url, timeout=5)
+                response.raise_for_status()
+
+        A block interrupted by a BaseException (task cancellation,
+        KeyboardInterrupt) records no outcome; a half-open trial slot it held
+        is given back.
+
+        Raises:
+            CircuitOpenError: without running the block, while the breaker is open
+        """
+        admitted = self._admit()
+        if admitted is None:
+            raise self._reject()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            if admitted == HALF_OPEN:
+                self._release_trial()
+            raise
+        self.record_success()
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) through the breaker"""
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    async def acall(self, fn, *args, **kwargs):
+        """await fn(*args, **kwargs) through the breaker"""
+        with self.guard():
+            return await fn(*args, **kwargs)
+
+    def metrics(self):
+        """State, counters and current window failure rate"""
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "calls": self._calls,
+                "failures": self._failures,
+                "rejected": self._rejected,
+                "window_failure_rate": round(self._failure_rate(), 3),
+                "times_opened": self._times_opened,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for a dependency, configured from CIRCUIT_BREAKERS"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **CIRCUIT_BREAKERS.get(name, {}))
+        return _breakers[name]
+
+
+def breaker_metrics():
+    """metrics() of every breaker created so far, by dependency name"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.metrics() for name, breaker in breakers.items()}
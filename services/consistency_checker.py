@@ -0,0 +1,135 @@
+import numpy as np
+
+from services.metric_extractor import format_value
+
+# Relative difference above which two claims about the same metric and period conflict
+RELATIVE_TOLERANCE = 0.10
+
+# Percent metrics (growth, churn) are compared in absolute percentage points
+PERCENT_POINT_TOLERANCE = 2.0
+
+SEVERITY_THRESHOLDS = [(0.5, "HIGH"), (0.25, "MEDIUM"), (0.0, "LOW")]
+PERCENT_SEVERITY_THRESHOLDS = [(10.0, "HIGH"), (5.0, "MEDIUM"), (0.0, "LOW")]
+
+# Claims with no period may be about different months: they are only compared
+# across documents (a deck's slides naturally show several months) and one severity lower
+UNSPECIFIED_PERIOD = "unspecified"
+SEVERITY_DOWNGRADE = {"HIGH": "MEDIUM", "MEDIUM": "LOW", "LOW": "LOW"}
+
+
+def _group_key(fact):
+    return fact["metric"], fact["unit"], fact.get("period") or UNSPECIFIED_PERIOD
+
+
+def _source_key(fact, period):
+    # Pairs are compared across chunks, or across documents for undated claims
+    if period == UNSPECIFIED_PERIOD:
+        return f"{fact['doc_type']}/{fact.get('filename')}"
+    return str(fact.get("chunk_id"))
+
+
+def _conflicting_pairs(values, sources, percent):
+    """
+    Vectorized pairwise comparison of every claim in one group
+
+    Returns:
+        (i, j) index arrays of conflicting pairs from different sources, and
+        the matrix of differences (relative, or percentage points for rates)
+    """
+    diff = np.abs(values[:, None] - values[None, :])
+    if percent:
+        spread = diff
+        conflict = diff > PERCENT_POINT_TOLERANCE
+    else:
+        scale = np.maximum(np.abs(values[:, None]), np.abs(values[None, :]))
+        spread = np.divide(diff, scale, out=np.zeros_like(diff), where=scale > 0)
+        conflict = spread > RELATIVE_TOLERANCE
+
+    different_source = sources[:, None] != sources[None, :]
+    upper = np.triu(np.ones_like(conflict, dtype=bool), k=1)
+    i, j = np.nonzero(conflict & different_source & upper)
+    return i, j, spread
+
+
+def check_consistency(facts):
+    """
+    Flag metrics that are stated with conflicting values for the same period
+
+    Every numeric claim across pitch deck, transcripts, emails and updates
+    is grouped by (metric, unit, period); within a group all pairs are
+    compared at once with NumPy broadcasting. Claims without a period are
+    only compared across documents, at one severity lower.
+
+    Returns:
+        List of findings sorted by spread: metric, period, severity, spread,
+        and the distinct claimed values with their sources
+    """
+    groups = {}
+    for fact in facts:
+        groups.setdefault(_group_key(fact), []).append(fact)
+
+    findings = []
+    for (metric, unit, period), group in groups.items():
+        if len(group) < 2:
+            continue
+
+        values = np.array([f["value"] for f in group], dtype=np.float64)
+        sources = np.array([_source_key(f, period) for f in group])
+        i, j, spread = _conflicting_pairs(values, sources, percent=unit == "percent")
+        if len(i) == 0:
+            continue
+
+        involved = sorted(set(i.tolist()) | set(j.tolist()), key=lambda k: values[k])
+        claims = []
+        seen = set()
+        for k in involved:
+            fact = group[k]
+            key = (fact["value"], fact["doc_type"], fact.get("page_number"))
+            if key in seen:
+                continue
+            seen.add(key)
+            claims.append({
+                "value": fact["value"],
+                "raw": fact["raw"],
+                "doc_type": fact["doc_type"],
+                "page_number": fact.get("page_number"),
+                "chunk_id": fact.get("chunk_id"),
+            })
+
+        max_spread = float(spread[i, j].max())
+        thresholds = PERCENT_SEVERITY_THRESHOLDS if unit == "percent" else SEVERITY_THRESHOLDS
+        severity = next(label for threshold, label in thresholds if max_spread > threshold)
+        if period == UNSPECIFIED_PERIOD:
+            severity = SEVERITY_DOWNGRADE[severity]
+        findings.append({
+            "metric": metric,
+            "unit": unit,
+            "period": period,
+            "severity": severity,
+            "spread": round(max_spread, 3),
+            "claims": claims,
+        })
+
+    findings.sort(key=lambda f: f["spread"], reverse=True)
+    return findings
+
+
+def format_findings(findings, limit=10):
+    """Compact evidence lines for the risk agent prompt"""
+    if not findings:
+        return "No conflicting numeric claims found across documents."
+
+    lines = []
+    for finding in findings[:limit]:
+        spread = (
+            f"{finding['spread']:g} pts" if finding["unit"] == "percent"
+            else f"{finding['spread']:.0%} apart"
+        )
+        claims = "; ".join(
+            f"{format_value(c['value'])} in {c['doc_type']}"
+            + (f" p.{c['page_number']}" if c["page_number"] is not None else "")
+            + f" (\"{c['raw']}\")"
+            for c in finding["claims"]
+        )
+        lines.append(f"- [{finding['severity']}] {finding['metric']} ({finding['period']}, {spread}): {claims}")
+    return "\n".join(lines)
@@ -0,0 +1,171 @@
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Word n-grams hashed into each MinHash signature
+SHINGLE_SIZE = 5
+
+# Signature length and LSH banding (NUM_PERM = BANDS * ROWS); 16 bands of 8
+# rows make pairs above ~0.7 Jaccard very likely to share a bucket
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity at or above which a chunk is a near-duplicate
+DUPLICATE_THRESHOLD = 0.85
+
+# Universal hashing h(x) = (a*x + b) mod p over 32-bit shingle hashes;
+# a*x + b stays below 2**64, so uint64 arithmetic is exact
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 2**32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text):
+    """Set of 32-bit hashes of the text's lower-cased word 5-grams"""
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+def minhash(text):
+    """MinHash signature of a text (NUM_PERM uint64 values), or None for an empty text"""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    # (NUM_PERM, n_shingles) permuted hashes, minimum per permutation
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def _band_keys(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+class _StartupState:
+    """LSH buckets and kept signatures for one startup"""
+
+    def __init__(self):
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of the chunks stored for each startup
+
+    Chunks are checked in order against everything already kept for the same
+    startup, across all of its documents and earlier uploads; the first copy
+    wins and later near-identical copies are reported as its duplicates.
+    Kept chunks only count once commit() confirms they were stored.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._states = defaultdict(_StartupState)
+        # Signatures of kept chunks not stored yet, by startup and chunk id
+        self._pending = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def _find(self, state, chunk_id, signature):
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates.update(state.buckets.get(key, ()))
+        candidates.discard(chunk_id)
+
+        best_id, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = float(np.mean(state.signatures[candidate] == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = candidate, similarity
+        return best_id if best_similarity >= self.threshold else None
+
+    def filter(self, startup_id, ids, chunks):
+        """
+        Split chunks into ones to keep and near-duplicates of earlier chunks
+
+        Duplicates within the same call are caught too. Kept chunks are held
+        back until commit() (once they are stored) or discard() (their batch
+        failed), so a chunk that never makes it into the store hides nothing.
+
+        Returns:
+            (kept positions, {duplicate_id: kept_id})
+        """
+        signatures = [minhash(str(chunk)) for chunk in chunks]
+
+        kept = []
+        duplicates = {}
+        batch = _StartupState()
+        with self._lock:
+            state = self._states[startup_id]
+            pending = self._pending[startup_id]
+            for position, (chunk_id, signature) in enumerate(zip(ids, signatures)):
+                if signature is None:
+                    kept.append(position)
+                    continue
+
+                original = self._find(state, chunk_id, signature) or self._find(batch, chunk_id, signature)
+                if original is not None:
+                    duplicates[chunk_id] = original
+                    continue
+
+                kept.append(position)
+                self._insert(batch, chunk_id, signature)
+                pending[chunk_id] = signature
+        return kept, duplicates
+
+    def commit(self, startup_id, ids):
+        """Index kept chunks that were stored, so later copies of them are dropped"""
+        with self._lock:
+            state = self._states[startup_id]
+            pending = self._pending[startup_id]
+            for chunk_id in ids:
+                signature = pending.pop(chunk_id, None)
+                if signature is not None:
+                    self._insert(state, chunk_id, signature)
+
+    def discard(self, startup_id, ids):
+        """Forget kept chunks that could not be stored"""
+        with self._lock:
+            pending = self._pending[startup_id]
+            for chunk_id in ids:
+                pending.pop(chunk_id, None)
+
+    def add(self, startup_id, ids, chunks):
+        """Index chunks that are already known to be kept (e.g. loaded from a snapshot), without filtering"""
+        signatures = [minhash(str(chunk)) for chunk in chunks]
+        with self._lock:
+            state = self._states[startup_id]
+            for chunk_id, signature in zip(ids, signatures):
+                if signature is not None:
+                    self._insert(state, chunk_id, signature)
+
+    def _insert(self, state, chunk_id, signature):
+        if chunk_id not in state.signatures:
+            for key in _band_keys(signature):
+                state.buckets[key].append(chunk_id)
+        state.signatures[chunk_id] = signature
+
+    def remove(self, startup_id, ids):
+        """Forget removed chunks, so a later copy of them is kept again"""
+        with self._lock:
+            state = self._states[startup_id]
+            pending = self._pending[startup_id]
+            for chunk_id in ids:
+                pending.pop(chunk_id, None)
+                signature = state.signatures.pop(chunk_id, None)
+                if signature is None:
+                    continue
+                for key in _band_keys(signature):
+                    bucket = state.buckets.get(key)
+                    if bucket and chunk_id in bucket:
+                        bucket.remove(chunk_id)
@@ -0,0 +1,95 @@
+PAGE_SEPARATOR = "\n\n"
+
+
+class PageSpan:
+    """A page (or email message) as a range of its document's buffer, with its provenance"""
+
+    __slots__ = ("start", "end", "provenance")
+
+    def __init__(self, start, end, provenance):
+        self.start = start
+        self.end = end
+        self.provenance = provenance
+
+
+class ChunkView:
+    """
+    A chunk as offsets into its document's buffer
+
+    The chunk text is only materialized by str(), at the embedding and
+    Chroma boundary.
+    """
+
+    __slots__ = ("document", "start", "end", "page")
+
+    def __init__(self, document, start, end, page):
+        self.document = document
+        self.start = start
+        self.end = end
+        self.page = page
+
+    def __str__(self):
+        return self.document.buffer[self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def provenance(self):
+        """Page / slide / sender metadata plus char_start / char_end within the page"""
+        page = self.document.pages[self.page]
+        return {**page.provenance, "char_start": self.start - page.start, "char_end": self.end - page.start}
+
+
+class SourceDocument:
+    """One uploaded file: its whole text in a single buffer, pages and chunks as offsets into it"""
+
+    __slots__ = ("filename", "buffer", "pages", "chunks")
+
+    def __init__(self, filename, buffer="", pages=None, chunks=None):
+        self.filename = filename
+        self.buffer = buffer
+        self.pages = pages or []
+        self.chunks = chunks or []
+
+    @property
+    def text(self):
+        return self.buffer
+
+
+def build_document(filename, pages, split):
+    """
+    Build a SourceDocument from (text, provenance) pages
+
+    Each page is split on its own, so chunks never span pages; the chunk
+    strings returned by split are only used to find offsets and are
+    dropped page by page.
+
+    Args:
+        filename: display name of the source file
+        pages: iterable of (page_text, provenance dict)
+        split: callable(text) -> list of chunk strings
+
+    Returns:
+        SourceDocument whose buffer is the pages joined by PAGE_SEPARATOR;
+        every page's text is kept, and held twice while they are joined
+    """
+    document = SourceDocument(filename)
+    texts = []
+    offset = 0
+    for page_text, provenance in pages:
+        page_index = len(document.pages)
+        document.pages.append(PageSpan(offset, offset + len(page_text), provenance))
+
+        position = 0
+        for chunk in split(page_text):
+            start = page_text.find(chunk, position)
+            if start < 0:
+                start = position
+            document.chunks.append(ChunkView(document, offset + start, offset + start + len(chunk), page_index))
+            position = start + 1
+
+        texts.append(page_text)
+        offset += len(page_text) + len(PAGE_SEPARATOR)
+
+    document.buffer = PAGE_SEPARATOR.join(texts)
+    return document
@@ -1,58 +1,266 @@
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from services.pdf_engines import get_pdf_engine
+from services.parse_sandbox import iter_parsed_pages, parse_in_sandbox
+from services.ocr import needs_ocr, ocr_pages
+from services.email_loader import EMAIL_EXTENSIONS, iter_email_documents
+from services.document_model import build_document
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_MAX_TOKENS, CHUNKING_MODE, CHUNK_OVERLAP_TOKENS,
+    UPLOAD_FOLDER, PERSIST_UPLOADS, OCR_ENABLED, OCR_DEADLINE_SECONDS, PARSE_SANDBOX, PARSE_DEADLINE_SECONDS,
+    EMAIL_GROUP_MESSAGES
+)
 
 import os
+import io
+import hashlib
+import itertools
+import shutil
+
+_tokenizer = None
+
+
+def get_embedding_tokenizer():
+    """Load (once per process) the tokenizer of the embedding model"""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    return _tokenizer
+
 
 class DocumentProcessor:
     """Process documents using LangChain"""
     
-    def __init__(self):
+    def __init__(self, chunking_mode=CHUNKING_MODE, pdf_engine=None):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
+        self.chunking_mode = chunking_mode
+        self._token_splitters = {}
+        self.pdf_engine = get_pdf_engine(pdf_engine)
+        self.sandbox = PARSE_SANDBOX
+        # One entry per sandboxed parse: status, pages, elapsed_seconds, error
+        self.parse_metrics = []
     
-    def load_pdf(self, file_path):
-        """Load PDF using LangChain PyPDFLoader"""
+    def _parse(self, kind, source, filename=None):
+        """
+        Extract (page_number, text) pairs, in a deadline- and memory-limited
+        worker process unless the sandbox is disabled
+        
+        Returns:
+            (pages, sandbox metrics or None when unsandboxed)
+        """
+        if not self.sandbox:
+            return list(iter_parsed_pages(kind, _as_stream(source), self.pdf_engine.name)), None
+        
+        # The worker opens paths itself; in-memory uploads are sent as bytes
+        data = os.fspath(source) if isinstance(source, (str, os.PathLike)) else _read_bytes(source)
+        pages, metrics = parse_in_sandbox(kind, data, filename or _source_name(source), self.pdf_engine.name)
+        self.parse_metrics.append(metrics)
+        return pages, metrics
+    
+    def load_pdf(self, source, filename=None):
+        """Load PDF from a path, bytes/memoryview or file object with the configured engine"""
         try:
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
+            extracted, metrics = self._parse("pdf", source, filename)
+            
+            # Image-only slides: fall back to local OCR for pages without a text layer
+            ocr_texts = {}
+            image_pages = [page_number for page_number, text in extracted if needs_ocr(text)]
+            if OCR_ENABLED and image_pages:
+                if metrics is None:
+                    ocr_texts = ocr_pages(_read_bytes(source), image_pages)
+                elif metrics["status"] != "ok":
+                    # A PDF that hit the deadline or memory ceiling is not opened again for OCR
+                    print(f"⚠️ Skipping OCR of {metrics['filename']}: parse stopped ({metrics['status']})")
+                else:
+                    # OCR counts against the same parse deadline
+                    remaining = PARSE_DEADLINE_SECONDS - metrics["elapsed_seconds"]
+                    ocr_texts = ocr_pages(_read_bytes(source), image_pages, min(OCR_DEADLINE_SECONDS, remaining))
+            
+            pages = []
+            for page_number, text in extracted:
+                metadata = {"source": filename or _source_name(source), "page_number": page_number}
+                if page_number in ocr_texts:
+                    text = ocr_texts[page_number]
+                    metadata["ocr"] = True
+                pages.append(Document(page_content=text, metadata=metadata))
             
             # Extract text from all pages
             text = "\n\n".join([page.page_content for page in pages])
             return text, pages
         except Exception as e:
-            print(f"Error loading PDF: {e}")
+            print(f"Error loading PDF ({self.pdf_engine.name}): {e}")
             return "", []
     
-    def load_docx(self, file_path):
-        """Load DOCX using LangChain"""
+    def load_docx(self, source, filename=None):
+        """Load DOCX from a path, bytes/memoryview or file object"""
         try:
-            loader = Docx2txtLoader(file_path)
-            documents = loader.load()
-            text = "\n\n".join([doc.page_content for doc in documents])
+            text = "".join(text for _, text in self._parse("docx", source, filename)[0])
+            documents = [Document(page_content=text, metadata={"source": filename or _source_name(source)})]
             return text, documents
         except Exception as e:
             print(f"Error loading DOCX: {e}")
             return "", []
     
-    def load_txt(self, file_path):
-        """Load TXT file"""
+    def load_txt(self, source, filename=None):
+        """Load TXT from a path, bytes/memoryview or file object"""
         try:
-            loader = TextLoader(file_path)
-            documents = loader.load()
-            text = "\n\n".join([doc.page_content for doc in documents])
+            text = "".join(text for _, text in self._parse("txt", source, filename)[0])
+            documents = [Document(page_content=text, metadata={"source": filename or _source_name(source)})]
             return text, documents
         except Exception as e:
             print(f"Error loading TXT: {e}")
             return "", []
     
-    def chunk_documents(self, text):
+    def load_email_archive(self, source, filename):
+        """
+        Stream an .eml/.mbox source message by message into one SourceDocument
+        
+        Every message is a page of the document, chunked separately and
+        carrying its sender, date and subject as provenance. Only parsing is
+        incremental: the document holds the text of every message (see
+        iter_email_archive for bounded memory).
+        """
+        # Paths are read line by line from disk rather than loaded whole
+        from_path = isinstance(source, (str, os.PathLike))
+        stream = open(source, "rb") if from_path else _as_stream(source)
+        try:
+            document = build_document(
+                filename,
+                iter_email_documents(stream, filename),
+                lambda body: self.chunk_documents(body, "emails")
+            )
+        finally:
+            if from_path:
+                stream.close()
+        
+        print(f"📧 {filename}: {len(document.pages)} messages, {len(document.chunks)} chunks")
+        return document
+    
+    def iter_email_archive(self, source, filename, group_size=EMAIL_GROUP_MESSAGES):
+        """
+        Stream an .eml/.mbox source as SourceDocuments of at most group_size messages
+        
+        Each group is yielded as soon as its last message is parsed, so a
+        consumer that indexes and drops every group holds one group at a
+        time, however large the export.
+        """
+        from_path = isinstance(source, (str, os.PathLike))
+        stream = open(source, "rb") if from_path else _as_stream(source)
+        messages = iter_email_documents(stream, filename)
+        split = lambda body: self.chunk_documents(body, "emails")
+        total_messages = total_chunks = 0
+        try:
+            while True:
+                document = build_document(filename, itertools.islice(messages, group_size), split)
+                if not document.pages:
+                    break
+                total_messages += len(document.pages)
+                total_chunks += len(document.chunks)
+                yield document
+        finally:
+            if from_path:
+                stream.close()
+        
+        print(f"📧 {filename}: {total_messages} messages, {total_chunks} chunks")
+    
+    def chunk_documents(self, text, doc_type=None):
         """Split text into chunks using LangChain"""
-        chunks = self.text_splitter.split_text(text)
+        splitter = self._get_splitter(doc_type)
+        chunks = splitter.split_text(text)
         return chunks
     
+    def build_document(self, pages, doc_type, filename):
+        """
+        Chunk each page (or whole document) separately into a compact SourceDocument
+        
+        Returns:
+            SourceDocument holding the text once, with chunks as offset views;
+            each chunk's provenance has page_number and slide_title (when the
+            source has pages) plus char_start / char_end within its page
+        """
+        def page_provenance(page):
+            if "page_number" not in page.metadata:
+                return {}
+            return {"page_number": page.metadata["page_number"], "slide_title": _slide_title(page.page_content)}
+        
+        return build_document(
+            filename,
+            ((page.page_content, page_provenance(page)) for page in pages),
+            lambda text: self.chunk_documents(text, doc_type)
+        )
+    
+    def _get_splitter(self, doc_type):
+        """Pick the character splitter or a token splitter sized to the embedding window"""
+        if self.chunking_mode != "tokens":
+            return self.text_splitter
+        
+        overlap = CHUNK_OVERLAP_TOKENS.get(doc_type, 32)
+        if overlap not in self._token_splitters:
+            try:
+                tokenizer = get_embedding_tokenizer()
+            except Exception as e:
+                print(f"⚠️ Tokenizer unavailable, falling back to character chunking: {e}")
+                self.chunking_mode = "chars"
+                return self.text_splitter
+            
+            # Leave room for the [CLS]/[SEP] tokens the model adds
+            self._token_splitters[overlap] = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                tokenizer,
+                chunk_size=EMBEDDING_MAX_TOKENS - 2,
+                chunk_overlap=overlap,
+            )
+        return self._token_splitters[overlap]
+    
+    def process_file(self, doc_kind, uploaded_file):
+        """
+        Parse and chunk a single upload
+        
+        Args:
+            doc_kind: pitch_deck, transcripts, emails or updates
+            uploaded_file: Streamlit UploadedFile (or any BytesIO with a name)
+        
+        Returns:
+            SourceDocument
+        """
+        self._persist_uploaded_file(uploaded_file)
+        
+        # .eml / .mbox: stream messages, chunk each one with its own metadata
+        if doc_kind == "emails" and uploaded_file.name.lower().endswith(EMAIL_EXTENSIONS):
+            return self.load_email_archive(uploaded_file, uploaded_file.name)
+        
+        if doc_kind == "pitch_deck":
+            _, pages = self.load_pdf(uploaded_file, uploaded_file.name)
+        else:
+            _, pages = self._load_uploaded_file(uploaded_file)
+        return self.build_document(pages, doc_kind, uploaded_file.name)
+    
+    def iter_documents(self, doc_kind, source, filename=None):
+        """
+        Parse and chunk a single upload as a stream of SourceDocuments
+        
+        An email archive comes in groups of EMAIL_GROUP_MESSAGES messages
+        (iter_email_archive); any other file is one document (process_file).
+        
+        Args:
+            doc_kind: pitch_deck, transcripts, emails or updates
+            source: in-memory upload (BytesIO with a name), or a path to an email archive
+            filename: display name; defaults to the upload's name
+        
+        Yields:
+            SourceDocument
+        """
+        filename = filename or source.name
+        if doc_kind == "emails" and filename.lower().endswith(EMAIL_EXTENSIONS):
+            self._persist_uploaded_file(source, filename)
+            yield from self.iter_email_archive(source, filename)
+        else:
+            yield self.process_file(doc_kind, source)
+    
     def process_uploaded_files(self, uploaded_files):
         """
         Process all uploaded files from Streamlit
@@ -61,10 +269,11 @@ class DocumentProcessor:
             uploaded_files: dict with keys: pitch_deck, transcripts, emails, updates
         
         Returns:
-            dict with extracted text and chunks
+            dict with one SourceDocument (pitch_deck, or None) or a list of
+            them per document type
         """
         extracted_data = {
-            "pitch_deck": {"text": "", "chunks": []},
+            "pitch_deck": None,
             "transcripts": [],
             "emails": [],
             "updates": []
@@ -72,78 +281,93 @@ class DocumentProcessor:
         
         # Process pitch deck (required)
         if uploaded_files.get('pitch_deck'):
-            pitch_file = uploaded_files['pitch_deck']
-            file_path = self._save_uploaded_file(pitch_file)
-            
-            text, _ = self.load_pdf(file_path)
-            chunks = self.chunk_documents(text)
-            
-            extracted_data['pitch_deck'] = {
-                "text": text,
-                "chunks": chunks,
-                "filename": pitch_file.name
-            }
-        
-        # Process transcripts (optional)
-        if uploaded_files.get('transcripts'):
-            for transcript_file in uploaded_files['transcripts']:
-                file_path = self._save_uploaded_file(transcript_file)
-                text, _ = self._load_file_by_extension(file_path)
-                chunks = self.chunk_documents(text)
-                
-                extracted_data['transcripts'].append({
-                    "text": text,
-                    "chunks": chunks,
-                    "filename": transcript_file.name
-                })
-        
-        # Process emails (optional)
-        if uploaded_files.get('emails'):
-            for email_file in uploaded_files['emails']:
-                file_path = self._save_uploaded_file(email_file)
-                text, _ = self._load_file_by_extension(file_path)
-                chunks = self.chunk_documents(text)
-                
-                extracted_data['emails'].append({
-                    "text": text,
-                    "chunks": chunks,
-                    "filename": email_file.name
-                })
-        
-        # Process founder updates (optional)
-        if uploaded_files.get('updates'):
-            for update_file in uploaded_files['updates']:
-                file_path = self._save_uploaded_file(update_file)
-                text, _ = self._load_file_by_extension(file_path)
-                chunks = self.chunk_documents(text)
-                
-                extracted_data['updates'].append({
-                    "text": text,
-                    "chunks": chunks,
-                    "filename": update_file.name
-                })
+            extracted_data['pitch_deck'] = self.process_file("pitch_deck", uploaded_files['pitch_deck'])
+        
+        # Process transcripts, emails and founder updates (optional)
+        for doc_kind in ("transcripts", "emails", "updates"):
+            for uploaded_file in uploaded_files.get(doc_kind) or []:
+                extracted_data[doc_kind].append(self.process_file(doc_kind, uploaded_file))
         
         return extracted_data
     
-    def _save_uploaded_file(self, uploaded_file):
-        """Save Streamlit uploaded file to disk"""
-        from config import UPLOAD_FOLDER
+    def _persist_uploaded_file(self, uploaded_file, filename=None):
+        """
+        Optionally keep a copy of an upload (or a file on disk) in content-addressed storage
+        
+        Files are named by the SHA-256 of their bytes, so identical uploads
+        are written once and different uploads never overwrite each other.
+        Parsing never reads this copy back.
+        """
+        if not PERSIST_UPLOADS:
+            return None
+        
+        from_path = isinstance(uploaded_file, (str, os.PathLike))
+        if from_path:
+            with open(uploaded_file, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+        else:
+            buffer = uploaded_file.getbuffer()
+            digest = hashlib.sha256(buffer).hexdigest()
+        ext = os.path.splitext(filename or uploaded_file.name)[1].lower()
+        file_path = os.path.join(UPLOAD_FOLDER, f"{digest}{ext}")
         
-        file_path = os.path.join(UPLOAD_FOLDER, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        if not os.path.exists(file_path):
+            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+            if from_path:
+                shutil.copyfile(uploaded_file, file_path)
+            else:
+                with open(file_path, "wb") as f:
+                    f.write(buffer)
         return file_path
     
-    def _load_file_by_extension(self, file_path):
-        """Load file based on extension"""
-        ext = os.path.splitext(file_path)[1].lower()
+    def _load_uploaded_file(self, uploaded_file):
+        """Load an in-memory upload (Streamlit's UploadedFile is a BytesIO) based on its extension"""
+        ext = os.path.splitext(uploaded_file.name)[1].lower()
         
         if ext == '.pdf':
-            return self.load_pdf(file_path)
+            return self.load_pdf(uploaded_file, uploaded_file.name)
         elif ext in ['.docx', '.doc']:
-            return self.load_docx(file_path)
-        elif ext == '.txt':
-            return self.load_txt(file_path)
+            return self.load_docx(uploaded_file, uploaded_file.name)
         else:
-            # Try as text
-            return self.load_txt(file_path)
\ No newline at end of file
+            # .txt and anything else: try as text
+            return self.load_txt(uploaded_file, uploaded_file.name)
+
+
+def _as_stream(source):
+    """Wrap a path, bytes-like object or file object as a readable binary stream"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return io.BytesIO(f.read())
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def _read_bytes(source):
+    """Raw bytes of a loader source (for the parse sandbox and OCR)"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def _slide_title(text, max_length=120):
+    """First non-empty line of a page, which on a slide is almost always its title"""
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            return line[:max_length]
+    return ""
+
+
+def _source_name(source):
+    """Best-effort display name for a loader source"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, "name", "upload")
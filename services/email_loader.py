@@ -0,0 +1,116 @@
+import re
+from email import policy
+from email.parser import BytesFeedParser, BytesParser
+from email.utils import parseaddr, parsedate_to_datetime
+
+from bs4 import BeautifulSoup
+
+EMAIL_EXTENSIONS = (".eml", ".mbox")
+
+# A reply header ends the new content of a message
+REPLY_HEADER_PATTERNS = [
+    re.compile(r"^On .{0,200}wrote:\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^_{10,}\s*$"),
+    re.compile(r"^From:\s.+$"),
+]
+
+# ...and so does a signature
+SIGNATURE_PATTERNS = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^Get Outlook for \w+", re.IGNORECASE),
+]
+
+
+def iter_messages(stream, filename):
+    """
+    Yield parsed messages from an .eml or .mbox stream one at a time
+
+    mbox archives are read line by line and each message is fed to its own
+    parser, so the parser only ever holds one message. The source itself
+    (an in-memory upload) and the document built from the messages still
+    grow with the export.
+    """
+    if filename.lower().endswith(".eml"):
+        yield BytesParser(policy=policy.default).parse(stream)
+        return
+
+    parser = None
+    previous_blank = True
+    for line in stream:
+        if line.startswith(b"From ") and previous_blank:
+            if parser is not None:
+                yield parser.close()
+            parser = BytesFeedParser(policy=policy.default)
+            previous_blank = False
+            continue
+
+        previous_blank = line in (b"\n", b"\r\n")
+        if parser is None:
+            continue
+
+        # mboxrd escapes body lines that start with "From "
+        if line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+            line = line[1:]
+        parser.feed(line)
+
+    if parser is not None:
+        yield parser.close()
+
+
+def message_body(message):
+    """Plain-text body of a message (HTML-only messages are flattened)"""
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except Exception:
+        payload = part.get_payload(decode=True) or b""
+        content = payload.decode("utf-8", errors="replace")
+    if part.get_content_type() == "text/html":
+        content = BeautifulSoup(content, "html.parser").get_text("\n")
+    return content
+
+
+def strip_quotes_and_signature(body):
+    """Keep only the new text of a message: drop quoted replies, reply headers and signatures"""
+    kept = []
+    for line in body.splitlines():
+        stripped = line.strip()
+        if any(p.match(stripped) for p in REPLY_HEADER_PATTERNS + SIGNATURE_PATTERNS):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line.rstrip())
+    return "\n".join(kept).strip()
+
+
+def message_metadata(message):
+    """Sender, subject and date of a message as Chroma-friendly (str/int) values"""
+    sender_name, sender = parseaddr(str(message.get("From", "")))
+    metadata = {
+        "sender": sender.lower(),
+        "sender_name": sender_name,
+        "subject": str(message.get("Subject", ""))[:200],
+    }
+    try:
+        sent_at = parsedate_to_datetime(str(message.get("Date")))
+        metadata["date"] = sent_at.date().isoformat()
+        metadata["date_ts"] = int(sent_at.timestamp())
+    except (TypeError, ValueError):
+        pass
+    return metadata
+
+
+def iter_email_documents(stream, filename):
+    """Yield (clean_body, metadata) for every non-empty message in an .eml/.mbox stream"""
+    for message_index, message in enumerate(iter_messages(stream, filename)):
+        body = strip_quotes_and_signature(message_body(message))
+        if not body:
+            continue
+        metadata = message_metadata(message)
+        metadata["message_index"] = message_index
+        yield body, metadata
@@ -0,0 +1,197 @@
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from services.email_loader import EMAIL_EXTENSIONS
+
+# Uploads parsed and embedded at the same time
+INGEST_MAX_WORKERS = int(os.getenv('INGEST_MAX_WORKERS', '2'))
+
+# Upload widget key -> doc_type stored with every chunk
+DOC_TYPES = {
+    "pitch_deck": "pitch_deck",
+    "transcripts": "transcript",
+    "emails": "email",
+    "updates": "update",
+}
+
+
+def content_digest(uploaded_file):
+    """SHA-256 of an upload's bytes (no copy)"""
+    return hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+
+
+def spool_upload(uploaded_file):
+    """Write an upload to a temporary file and return its path"""
+    ext = os.path.splitext(uploaded_file.name)[1]
+    with tempfile.NamedTemporaryFile("wb", suffix=ext, delete=False) as f:
+        f.write(uploaded_file.getbuffer())
+    return f.name
+
+
+def _remove_spooled(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+class IngestionPipeline:
+    """
+    Parse, chunk and embed every upload in the background as soon as it arrives
+
+    Jobs are keyed by (document kind, content hash): re-running the Streamlit
+    script with the same files starts nothing new, a file removed from an
+    uploader is deleted from the index, and a replaced file is ingested under
+    its new hash. By the time the analysis starts the index is usually warm.
+    """
+
+    def __init__(self, processor, rag, startup_id, max_workers=INGEST_MAX_WORKERS):
+        self.processor = processor
+        self.rag = rag
+        self.startup_id = startup_id
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = {}
+        # Deletes still pending per job key; a re-upload of the same content waits for its delete
+        self._deleting = {}
+        # Reentrant: a finished job's done-callback (the delete) runs inside sync()
+        self._lock = threading.RLock()
+
+    @property
+    def deck_digest(self):
+        """Content hash of the pitch deck being ingested, if any"""
+        with self._lock:
+            return next((digest for kind, digest in self._jobs if kind == "pitch_deck"), None)
+
+    def sync(self, uploaded_files):
+        """
+        Match the jobs to what is currently uploaded
+
+        Args:
+            uploaded_files: dict with keys pitch_deck (one file or None),
+                transcripts, emails, updates (lists)
+        """
+        current = {}
+        for doc_kind, files in uploaded_files.items():
+            if not files:
+                continue
+            for uploaded_file in files if isinstance(files, list) else [files]:
+                current[(doc_kind, content_digest(uploaded_file))] = uploaded_file
+
+        with self._lock:
+            for key in [key for key in self._jobs if key not in current]:
+                self._forget(key, self._jobs.pop(key))
+
+            for key, uploaded_file in current.items():
+                if key in self._jobs:
+                    continue
+                filename = uploaded_file.name
+                if key[0] == "emails" and filename.lower().endswith(EMAIL_EXTENSIONS):
+                    # Streamed from disk group by group: the job never holds the whole export
+                    data = spool_upload(uploaded_file)
+                else:
+                    # Own copy of the bytes: Streamlit hands out a fresh UploadedFile on every rerun
+                    data = io.BytesIO(uploaded_file.getvalue())
+                    data.name = filename
+                future = self._pool.submit(self._ingest, key, data, filename, self._deleting.pop(key, None))
+                if isinstance(data, str):
+                    # Also runs when the job is cancelled before it starts
+                    future.add_done_callback(lambda _, path=data: _remove_spooled(path))
+                self._jobs[key] = future
+
+    def _ingest(self, key, data, filename, pending_delete=None):
+        doc_kind, digest = key
+        if pending_delete is not None:
+            # Same chunk ids as the removed copy: let its delete finish first
+            pending_delete.result()
+        started = time.perf_counter()
+        added = 0
+        # One document per file, or one per group of messages for an email archive
+        for part, document in enumerate(self.processor.iter_documents(doc_kind, data, filename)):
+            added += self.rag.add_document(document, DOC_TYPES[doc_kind], self.startup_id, digest[:16], part=part)
+        return {
+            "doc_kind": doc_kind,
+            "filename": filename,
+            "chunks": added,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    def _forget(self, key, future):
+        """Cancel a queued job, or delete the document once its running job finishes (caller holds the lock)"""
+        if future.cancel():
+            return
+        deleted = Future()
+        self._deleting[key] = deleted
+        future.add_done_callback(lambda _: self._delete(key, deleted))
+
+    def _delete(self, key, deleted):
+        try:
+            self.rag.delete_document(self.startup_id, key[1][:16], DOC_TYPES[key[0]])
+        finally:
+            deleted.set_result(None)
+            with self._lock:
+                if self._deleting.get(key) is deleted:
+                    del self._deleting[key]
+
+    def close(self):
+        """
+        Stop ingesting and remove this startup from the index, e.g. when its
+        pitch deck is replaced by a new one (a new startup)
+
+        Runs in the background: queued jobs are cancelled, running ones
+        finish first so nothing they add outlives the clear. An analysed
+        startup stays available to similar_startups.
+        """
+        with self._lock:
+            self._jobs.clear()
+        threading.Thread(target=self._close, name="ingest-close", daemon=True).start()
+
+    def _close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        removed = self.rag.clear_startup(self.startup_id, keep_analysed=True)
+        print(f"🗑️ Cleared {removed} chunks of replaced startup {self.startup_id}")
+
+    def status(self):
+        """(documents indexed, documents total)"""
+        with self._lock:
+            futures = list(self._jobs.values())
+        return sum(future.done() for future in futures), len(futures)
+
+    def wait(self, doc_types=None, progress_callback=None):
+        """
+        Block until every current upload (or every upload of the given doc
+        types) is indexed; this is the readiness signal agents wait on
+
+        Args:
+            doc_types: optional iterable of doc types, e.g. ("pitch_deck",)
+            progress_callback: optional callable(done_documents, total_documents),
+                called from the waiting thread
+
+        Returns:
+            One summary per document: doc_kind, filename, chunks, seconds (or error)
+        """
+        with self._lock:
+            futures = [
+                future for (doc_kind, _), future in self._jobs.items()
+                if doc_types is None or DOC_TYPES[doc_kind] in doc_types
+            ]
+
+        pending = set(futures)
+        while pending:
+            if progress_callback:
+                progress_callback(len(futures) - len(pending), len(futures))
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if progress_callback:
+            progress_callback(len(futures), len(futures))
+
+        summaries = []
+        for future in futures:
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                print(f"❌ Background ingestion failed: {e}")
+                summaries.append({"error": str(e)})
+        return summaries
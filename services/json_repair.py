@@ -0,0 +1,227 @@
+import json
+import threading
+from collections import defaultdict
+
+# Cut points tried (latest first) when salvaging the longest valid prefix
+MAX_PREFIX_ATTEMPTS = 64
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_VALUE_END = ",:}]"
+
+
+class JSONRepairError(ValueError):
+    """Model output that could not be repaired into JSON"""
+
+
+def _next_significant(text, i):
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _read_string(text, i, fixes):
+    """
+    Read the string starting at text[i] (double or single quoted) and
+    return (JSON string literal, index after it)
+
+    A quote that is not followed by , : } ] or the end of the text is taken
+    as an unescaped quote inside the string.
+    """
+    quote = text[i]
+    if quote == "'":
+        fixes.add("single quotes")
+    chars = []
+    j = i + 1
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            if j + 1 == len(text):
+                break
+            escaped = text[j + 1]
+            chars.append("'" if escaped == "'" else "\\" + escaped)
+            j += 2
+            continue
+        if c == quote:
+            following = _next_significant(text, j + 1)
+            if following == "" or following in _VALUE_END:
+                return '"' + "".join(chars) + '"', j + 1
+            fixes.add("unescaped quotes")
+            chars.append('\\"' if c == '"' else c)
+        elif c == '"':
+            chars.append('\\"')
+        elif c == "\n":
+            fixes.add("control characters")
+            chars.append("\\n")
+        elif c in "\r\t":
+            fixes.add("control characters")
+            chars.append("\\r" if c == "\r" else "\\t")
+        else:
+            chars.append(c)
+        j += 1
+
+    fixes.add("truncated")
+    return '"' + "".join(chars) + '"', len(text)
+
+
+def _drop_trailing_comma(pieces, fixes):
+    j = len(pieces) - 1
+    while j >= 0 and pieces[j].isspace():
+        j -= 1
+    if j >= 0 and pieces[j] == ",":
+        del pieces[j]
+        fixes.add("trailing commas")
+
+
+def _close(stack):
+    return "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def _scan(text, fixes):
+    """
+    One pass over text from its first { or [, emitting repaired JSON pieces
+
+    Returns:
+        (pieces, cut_points, open_stack) where cut_points holds
+        (piece count, open containers) before every comma, i.e. after each
+        complete member, for salvaging a prefix
+    """
+    pieces = []
+    stack = []
+    cuts = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            literal, i = _read_string(text, i, fixes)
+            pieces.append(literal)
+            continue
+
+        if ch in "{[":
+            stack.append(ch)
+            pieces.append(ch)
+        elif ch in "}]":
+            if _CLOSERS[stack[-1]] != ch:
+                # Wrong bracket type: close the innermost open container instead
+                fixes.add("unbalanced brackets")
+                ch = _CLOSERS[stack[-1]]
+            _drop_trailing_comma(pieces, fixes)
+            pieces.append(ch)
+            stack.pop()
+            if not stack:
+                if text[i + 1:].strip():
+                    fixes.add("trailing text")
+                return pieces, cuts, stack
+        elif ch == ",":
+            _drop_trailing_comma(pieces, fixes)
+            cuts.append((len(pieces), tuple(stack)))
+            pieces.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < len(text) and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if word in _LITERALS:
+                fixes.add("python literals")
+            pieces.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        elif ch == "/" and text.startswith("//", i):
+            fixes.add("comments")
+            newline = text.find("\n", i)
+            i = len(text) if newline < 0 else newline
+            continue
+        else:
+            pieces.append(ch)
+        i += 1
+
+    if stack:
+        fixes.add("truncated")
+        _drop_trailing_comma(pieces, fixes)
+    return pieces, cuts, stack
+
+
+def repair_json(text):
+    """
+    Parse model output as JSON, repairing what it can
+
+    Handles markdown fences and prose around the value, trailing commas,
+    single-quoted strings, unescaped quotes and raw newlines in strings,
+    Python True/False/None, // comments, unbalanced or missing closing
+    brackets and truncated output. When the repaired text still does not
+    parse, the longest prefix of complete members that does is kept.
+
+    Returns:
+        (data, status, fixes): status is "clean", "repaired" or "salvaged"
+        (a prefix was dropped); fixes lists what was repaired
+
+    Raises:
+        JSONRepairError: nothing parseable was found
+    """
+    try:
+        return json.loads(text), "clean", []
+    except (json.JSONDecodeError, TypeError):
+        pass
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise JSONRepairError("no JSON object or array in the response")
+    start = min(starts)
+
+    fixes = set()
+    if text[:start].strip():
+        fixes.add("leading text")
+    pieces, cuts, stack = _scan(text[start:], fixes)
+
+    try:
+        return json.loads("".join(pieces) + _close(stack)), "repaired", sorted(fixes)
+    except json.JSONDecodeError:
+        pass
+
+    for count, open_stack in reversed(cuts[-MAX_PREFIX_ATTEMPTS:]):
+        try:
+            data = json.loads("".join(pieces[:count]) + _close(open_stack))
+        except json.JSONDecodeError:
+            continue
+        return data, "salvaged", sorted(fixes | {"longest valid prefix"})
+
+    raise JSONRepairError(f"unrepairable JSON ({', '.join(sorted(fixes)) or 'no known issue'})")
+
+
+_stats = defaultdict(lambda: {"clean": 0, "repaired": 0, "salvaged": 0, "failed": 0})
+_stats_lock = threading.Lock()
+
+
+def parse_json(text, agent="llm"):
+    """repair_json(text)[0], counting the outcome under the agent's name"""
+    return parse_json_status(text, agent)[0]
+
+
+def parse_json_status(text, agent="llm"):
+    """repair_json(text), counting the outcome under the agent's name"""
+    try:
+        data, status, fixes = repair_json(text)
+    except JSONRepairError as e:
+        with _stats_lock:
+            _stats[agent]["failed"] += 1
+        print(f"❌ {agent}: {e}")
+        raise
+
+    with _stats_lock:
+        _stats[agent][status] += 1
+    if status != "clean":
+        print(f"🔧 {agent}: JSON {status} ({', '.join(fixes)})")
+    return data, status, fixes
+
+
+def repair_stats():
+    """
+    Outcome counts per agent, with repair_success_rate: the share of
+    responses that were not clean JSON but still parsed (None until one occurs)
+    """
+    with _stats_lock:
+        stats = {agent: dict(counts) for agent, counts in _stats.items()}
+    for counts in stats.values():
+        broken = counts["repaired"] + counts["salvaged"] + counts["failed"]
+        counts["repair_success_rate"] = round((broken - counts["failed"]) / broken, 3) if broken else None
+    return stats
@@ -0,0 +1,130 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for",
+    "from", "has", "have", "how", "in", "is", "it", "its", "of", "on", "or",
+    "the", "their", "they", "this", "to", "was", "were", "what", "when",
+    "where", "which", "who", "why", "with",
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed ("ARR", "$2.5M" -> "arr", "2.5m")"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked id lists into one
+
+    Each id scores sum(1 / (k + rank)) over the lists it appears in, so an
+    id ranked well by either retriever rises without tuning score scales.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+_OPERATORS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+}
+
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma-style metadata filter ({"$and": [...]}, {"page_number": {"$in": [...]}}) locally"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over each startup's chunks"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # startup_id -> term -> {chunk_id: term frequency}
+        self._postings = defaultdict(lambda: defaultdict(dict))
+        # startup_id -> chunk_id -> (token count, metadata)
+        self._chunks = defaultdict(dict)
+        self._total_length = defaultdict(int)
+
+    def add(self, startup_id, ids, texts, metadatas):
+        """Index chunks of one startup; ids that are already indexed are skipped"""
+        with self._lock:
+            postings = self._postings[startup_id]
+            chunks = self._chunks[startup_id]
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                if chunk_id in chunks:
+                    continue
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                chunks[chunk_id] = (length, metadata)
+                self._total_length[startup_id] += length
+                for term, tf in terms.items():
+                    postings[term][chunk_id] = tf
+
+    def remove(self, startup_id, ids):
+        """Drop chunks of one startup from the index"""
+        removed = set(ids)
+        with self._lock:
+            chunks = self._chunks[startup_id]
+            for chunk_id in removed & chunks.keys():
+                length, _ = chunks.pop(chunk_id)
+                self._total_length[startup_id] -= length
+            for term, matches in list(self._postings[startup_id].items()):
+                for chunk_id in removed & matches.keys():
+                    del matches[chunk_id]
+                if not matches:
+                    del self._postings[startup_id][term]
+
+    def search(self, startup_id, query, n_results, where=None):
+        """Return up to n_results chunk ids ranked by BM25 score, optionally filtered by metadata"""
+        with self._lock:
+            chunks = self._chunks.get(startup_id)
+            if not chunks:
+                return []
+            postings = self._postings[startup_id]
+            n_chunks = len(chunks)
+            avg_length = self._total_length[startup_id] / n_chunks or 1.0
+
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                matches = postings.get(term)
+                if not matches:
+                    continue
+                idf = math.log(1 + (n_chunks - len(matches) + 0.5) / (len(matches) + 0.5))
+                for chunk_id, tf in matches.items():
+                    length, metadata = chunks[chunk_id]
+                    if where and not matches_where(metadata, where):
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores, key=scores.get, reverse=True)[:n_results]
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+import google.generativeai as genai
+import numpy as np
+
+from config import (
+    LLM_BACKEND, LLM_TIMEOUT_SECONDS, LLM_HEDGING, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MAX_RATE,
+    LLM_HEDGE_MIN_SAMPLES, LLM_LATENCY_WINDOW
+)
+from services.circuit_breaker import get_breaker
+from services.json_repair import parse_json_status
+from services.llm_schema import (
+    SchemaValidationError, drop_invalid_items, example_for, fill_missing, neutral_for, validate
+)
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """
+    Offline stand-in for a Gemini model (LLM_BACKEND=stub): answers with the
+    minimal value matching the requested response_schema, or "{}" without one
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        schema = (generation_config or {}).get("response_schema")
+        return StubResponse(json.dumps(example_for(schema) if schema else {}))
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        return self.generate_content(prompt, generation_config, **kwargs)
+
+
+class HedgingPolicy:
+    """
+    When to fire a duplicate request: once a call has run past the given
+    percentile of recent latencies, for at most max_rate of recent requests
+    """
+
+    def __init__(self, percentile=LLM_HEDGE_PERCENTILE, max_rate=LLM_HEDGE_MAX_RATE,
+                 min_samples=LLM_HEDGE_MIN_SAMPLES, window=LLM_LATENCY_WINDOW):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._hedged = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def delay(self):
+        """Seconds to wait before hedging, or None until enough latencies are recorded"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return float(np.percentile(self._latencies, self.percentile))
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def start_request(self):
+        with self._lock:
+            self._requests += 1
+            self._hedged.append(False)
+
+    def try_hedge(self):
+        """Claim a hedge for the current request unless the hedge-rate cap is reached"""
+        with self._lock:
+            if sum(self._hedged) + 1 > self.max_rate * len(self._hedged):
+                return False
+            self._hedged[-1] = True
+            self._hedges += 1
+            return True
+
+    def record_hedge_win(self):
+        with self._lock:
+            self._hedge_wins += 1
+
+    def metrics(self):
+        delay = self.delay()
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedged": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "recent_hedge_rate": round(sum(self._hedged) / len(self._hedged), 3) if self._hedged else 0.0,
+                "hedge_after_seconds": round(delay, 2) if delay is not None else None,
+            }
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedging_policy(model_name):
+    """The process-wide hedging policy (and latency history) of a model"""
+    with _policies_lock:
+        if model_name not in _policies:
+            _policies[model_name] = HedgingPolicy()
+        return _policies[model_name]
+
+
+def hedging_metrics():
+    """metrics() of every model's hedging policy, by model name"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.metrics() for name, policy in policies.items()}
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop():
+    """One background event loop for every hedged call, so async clients stay bound to a single loop"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-hedging", daemon=True).start()
+        return _loop
+
+
+class GeminiClient:
+    """
+    A Gemini model behind the "gemini" circuit breaker, with a request timeout
+
+    Drop-in for genai.GenerativeModel in the agents: while the breaker is
+    open generate_content raises CircuitOpenError at once, and the agent
+    falls back to its default output.
+
+    With hedging on (LLM_HEDGING), a call still running after
+    LLM_HEDGE_PERCENTILE of the model's recent latencies gets a duplicate
+    request; the first successful response wins and the other is cancelled.
+    """
+
+    def __init__(self, model_name, agent="llm", timeout=LLM_TIMEOUT_SECONDS, hedging=LLM_HEDGING):
+        self.model_name = model_name
+        self.agent = agent
+        self.model = StubModel(model_name) if LLM_BACKEND == "stub" else genai.GenerativeModel(model_name)
+        self.timeout = timeout
+        self.hedging = hedging
+        self.breaker = get_breaker("gemini")
+        self.policy = get_hedging_policy(model_name)
+
+    def generate_content(self, prompt, **kwargs):
+        kwargs.setdefault("request_options", {"timeout": self.timeout})
+        if self.hedging:
+            return self.breaker.call(self._generate_hedged, prompt, kwargs)
+        return self.breaker.call(self._generate, prompt, kwargs)
+
+    def generate_json(self, prompt, schema, defaults=None):
+        """
+        Schema-constrained JSON from the model, parsed and validated locally
+
+        Malformed or truncated output goes through the tolerant parser
+        (services/json_repair.py, outcomes counted per agent) before giving up.
+        Fields missing from the response (e.g. cut off by truncation) get
+        neutral values (llm_schema.neutral_for) and list items that don't
+        match the schema are dropped. Such a result carries "_repair":
+        "salvaged" (a broken tail was dropped), "truncated" (the output was
+        cut off, e.g. mid-string) or "incomplete" (fields were missing).
+
+        Args:
+            prompt: the agent prompt
+            schema: response schema (services/llm_schema.py), sent as the
+                response_schema of a JSON-mode request
+            defaults: optional agent output whose numbers (midpoint scores)
+                fill missing numeric fields instead of 0
+
+        Raises:
+            JSONRepairError: the response could not be repaired into JSON
+            SchemaValidationError: the response does not match the schema
+        """
+        response = self.generate_content(prompt, generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+        })
+        data, status, fixes = parse_json_status(response.text, self.agent)
+        if status == "salvaged":
+            repair = "salvaged"
+        elif "truncated" in fixes:
+            repair = "truncated"
+        else:
+            repair = "incomplete" if validate(data, schema) else None
+        data = drop_invalid_items(fill_missing(data, neutral_for(schema, defaults), schema), schema)
+        errors = validate(data, schema)
+        if errors:
+            raise SchemaValidationError(errors)
+        if repair:
+            data["_repair"] = repair
+        return data
+
+    def _generate(self, prompt, kwargs):
+        started = time.perf_counter()
+        response = self.model.generate_content(prompt, **kwargs)
+        self.policy.record_latency(time.perf_counter() - started)
+        return response
+
+    def _generate_hedged(self, prompt, kwargs):
+        future = asyncio.run_coroutine_threadsafe(self._race(prompt, kwargs), _event_loop())
+        return future.result()
+
+    async def _attempt(self, prompt, kwargs):
+        started = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, **kwargs)
+        return response, time.perf_counter() - started
+
+    async def _race(self, prompt, kwargs):
+        self.policy.start_request()
+        primary = asyncio.ensure_future(self._attempt(prompt, kwargs))
+        delay = self.policy.delay()
+        if delay is not None:
+            await asyncio.wait({primary}, timeout=delay)
+
+        if primary.done() or delay is None or not self.policy.try_hedge():
+            response, elapsed = await primary
+            self.policy.record_latency(elapsed)
+            return response
+
+        print(f"⏱️ {self.model_name} slower than p{self.policy.percentile} ({delay:.1f}s), hedging")
+        backup = asyncio.ensure_future(self._attempt(prompt, kwargs))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response, elapsed = task.result()
+                    self.policy.record_latency(elapsed)
+                    if task is backup:
+                        self.policy.record_hedge_win()
+                    return response
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
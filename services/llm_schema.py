@@ -0,0 +1,164 @@
+# Response schemas in the OpenAPI subset Gemini's structured output accepts
+# (uppercase types, properties, required, items, enum, nullable)
+
+
+class SchemaValidationError(ValueError):
+    """A model response that does not match the requested schema"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors[:5]) + (f" (+{len(errors) - 5} more)" if len(errors) > 5 else ""))
+        self.errors = errors
+
+
+def string(enum=None, nullable=False):
+    schema = {"type": "STRING"}
+    if enum:
+        schema["enum"] = list(enum)
+    if nullable:
+        schema["nullable"] = True
+    return schema
+
+
+def number(nullable=False):
+    return {"type": "NUMBER", "nullable": True} if nullable else {"type": "NUMBER"}
+
+
+def integer(nullable=False):
+    return {"type": "INTEGER", "nullable": True} if nullable else {"type": "INTEGER"}
+
+
+def boolean():
+    return {"type": "BOOLEAN"}
+
+
+def array(items):
+    return {"type": "ARRAY", "items": items}
+
+
+def obj(properties, required=None):
+    """OBJECT schema; every property is required unless required lists a subset"""
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(properties) if required is None else list(required),
+    }
+
+
+def _type_matches(value, schema_type):
+    if schema_type == "OBJECT":
+        return isinstance(value, dict)
+    if schema_type == "ARRAY":
+        return isinstance(value, list)
+    if schema_type == "STRING":
+        return isinstance(value, str)
+    if schema_type == "BOOLEAN":
+        return isinstance(value, bool)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return schema_type == "NUMBER" or float(value).is_integer()
+
+
+def validate(data, schema, path="$"):
+    """
+    Check data against a response schema
+
+    Returns:
+        List of error strings such as "$.metrics.mrr: expected NUMBER, got str";
+        empty when data matches. Properties not in the schema are allowed.
+    """
+    if data is None:
+        return [] if schema.get("nullable") else [f"{path}: null not allowed"]
+
+    schema_type = schema.get("type")
+    if not _type_matches(data, schema_type):
+        return [f"{path}: expected {schema_type}, got {type(data).__name__}"]
+
+    errors = []
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: {data!r} not one of {schema['enum']}")
+    if schema_type == "OBJECT":
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}.{key}: missing")
+        for key, value in data.items():
+            if key in properties:
+                errors.extend(validate(value, properties[key], f"{path}.{key}"))
+    elif schema_type == "ARRAY" and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def fill_missing(data, default, schema):
+    """Copy schema properties missing from data (recursively, for nested objects) from default"""
+    if not isinstance(data, dict) or not isinstance(default, dict):
+        return data
+    for key, property_schema in schema.get("properties", {}).items():
+        if key not in default:
+            continue
+        if key not in data:
+            data[key] = default[key]
+        else:
+            fill_missing(data[key], default[key], property_schema)
+    return data
+
+
+def drop_invalid_items(data, schema):
+    """Remove array items that don't match their schema (e.g. the half-written last item of a truncated list)"""
+    if isinstance(data, dict):
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in data:
+                data[key] = drop_invalid_items(data[key], property_schema)
+    elif isinstance(data, list) and "items" in schema:
+        data = [drop_invalid_items(item, schema["items"]) for item in data]
+        data = [item for item in data if not validate(item, schema["items"])]
+    return data
+
+
+# Enum values preferred when a missing field has to be filled in without an answer
+NEUTRAL_ENUM_VALUES = ("Unknown", "Unclear", "Unable to verify", "MAYBE", "Medium", "MEDIUM", "Moderate", "Other", "None")
+
+
+def neutral_for(schema, defaults=None):
+    """
+    An empty value that matches the schema, for fields a model response left out
+
+    Numbers come from defaults (e.g. an agent's midpoint scores: 0 would read
+    as "lowest risk" or "worst deal"), else 0. Otherwise null where allowed,
+    "" / False / [], and an "Unknown"-style enum value (NEUTRAL_ENUM_VALUES)
+    where the enum has one.
+    """
+    schema_type = schema.get("type")
+    if schema_type in ("NUMBER", "INTEGER") and _type_matches(defaults, schema_type):
+        return defaults
+    if schema.get("nullable"):
+        return None
+    if "enum" in schema:
+        return next((value for value in NEUTRAL_ENUM_VALUES if value in schema["enum"]), schema["enum"][0])
+    if schema_type == "OBJECT":
+        defaults = defaults if isinstance(defaults, dict) else {}
+        return {key: neutral_for(value, defaults.get(key)) for key, value in schema.get("properties", {}).items()}
+    if schema_type == "ARRAY":
+        return []
+    if schema_type == "STRING":
+        return ""
+    if schema_type == "BOOLEAN":
+        return False
+    return 0
+
+
+def example_for(schema):
+    """A minimal value that matches the schema (used by the stub LLM backend)"""
+    schema_type = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if schema_type == "OBJECT":
+        return {key: example_for(value) for key, value in schema.get("properties", {}).items()}
+    if schema_type == "ARRAY":
+        return [example_for(schema["items"])] if "items" in schema else []
+    if schema_type == "STRING":
+        return "stub"
+    if schema_type == "BOOLEAN":
+        return False
+    return 0
@@ -0,0 +1,263 @@
+import re
+from collections import Counter
+
+CURRENCIES = {"$": "USD", "€": "EUR", "£": "GBP", "₹": "INR"}
+
+SCALES = {
+    "k": 1e3, "thousand": 1e3,
+    "m": 1e6, "mm": 1e6, "mn": 1e6, "million": 1e6,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+}
+
+MONEY = (
+    r"(?P<cur>[$€£₹])\s?(?P<num>\d[\d,]*(?:\.\d+)?)\s?"
+    r"(?P<scale>thousand|million|billion|mm|mn|bn|[kmb])?\b"
+)
+COUNT = r"(?P<num>\d[\d,]*(?:\.\d+)?)\s?(?P<scale>thousand|million|[km])?\+?"
+PERCENT = r"(?P<num>\d+(?:\.\d+)?)\s?%"
+
+# Words allowed between a metric keyword and its value ("ARR of", "burn is at", "MRR:")
+LINK = r"[\s:=\-–]*(?:(?:of|is|at|was|reached|now|currently|around|about|approx\.?|~)[\s:]*){0,3}"
+
+MONEY_METRICS = {
+    "mrr": r"\bMRR\b|monthly recurring revenue",
+    "arr": r"\bARR\b|annual(?:ized)? recurring revenue|annual run[- ]rate",
+    "revenue": r"(?<!recurring )\brevenues?\b|\bsales\b|\bGMV\b",
+    "burn_rate_monthly": r"\b(?:monthly )?burn(?: rate)?\b",
+    "total_raised": r"\braised\b|\btotal funding\b",
+    "last_round_amount": r"\braising\b|\bseeking\b|\bround size\b",
+    "tam": r"\bTAM\b|total addressable market",
+}
+
+
+def _metric_patterns():
+    """Compile keyword-then-value and value-then-keyword patterns for every metric"""
+    patterns = []
+    for metric, keyword in MONEY_METRICS.items():
+        patterns.append((metric, "money", re.compile(rf"(?:{keyword}){LINK}{MONEY}", re.IGNORECASE)))
+        patterns.append((metric, "money", re.compile(rf"{MONEY}\s?(?:in\s|of\s)?(?:{keyword})", re.IGNORECASE)))
+
+    patterns += [
+        ("customers", "count", re.compile(
+            rf"{COUNT}\s(?:paying\s|active\s|enterprise\s|b2b\s)?(?:customers|clients|subscribers|paying users)\b",
+            re.IGNORECASE)),
+        ("customers", "count", re.compile(rf"\b(?:customers|clients){LINK}{COUNT}(?!\s?%)", re.IGNORECASE)),
+        ("employees", "count", re.compile(
+            rf"{COUNT}\s(?:full[- ]time\s)?(?:employees|FTEs?|team members|people on the team)\b", re.IGNORECASE)),
+        ("employees", "count", re.compile(rf"\b(?:team size|headcount){LINK}{COUNT}", re.IGNORECASE)),
+        ("runway_months", "months", re.compile(
+            r"(?P<num>\d+(?:\.\d+)?)\s?(?:months?|mos?)\s(?:of\s)?(?:cash\s)?runway", re.IGNORECASE)),
+        ("runway_months", "months", re.compile(
+            rf"\brunway{LINK}(?P<num>\d+(?:\.\d+)?)\s?(?:months?|mos?)\b", re.IGNORECASE)),
+        ("growth_rate_monthly", "percent", re.compile(
+            rf"{PERCENT}\s(?:MoM|month[- ]over[- ]month|monthly growth|growth (?:per|a|each) month)", re.IGNORECASE)),
+        ("growth_rate_monthly", "percent", re.compile(
+            rf"\b(?:MoM growth|monthly growth(?: rate)?){LINK}{PERCENT}", re.IGNORECASE)),
+        ("churn_rate", "percent", re.compile(rf"{PERCENT}\s(?:monthly\s|annual\s)?(?:churn|logo churn)", re.IGNORECASE)),
+        ("churn_rate", "percent", re.compile(rf"\bchurn(?: rate)?{LINK}{PERCENT}", re.IGNORECASE)),
+    ]
+    return patterns
+
+
+METRIC_PATTERNS = _metric_patterns()
+
+# Where each metric lands in DataExtractionAgent's output
+FIELD_TARGETS = {
+    "mrr": ("metrics", "mrr"),
+    "arr": ("metrics", "arr"),
+    "revenue": ("metrics", "revenue"),
+    "growth_rate_monthly": ("metrics", "growth_rate_monthly"),
+    "customers": ("metrics", "customers"),
+    "burn_rate_monthly": ("metrics", "burn_rate_monthly"),
+    "runway_months": ("metrics", "runway_months"),
+    "churn_rate": ("metrics", "churn_rate"),
+    "total_raised": ("funding", "total_raised"),
+    "last_round_amount": ("funding", "last_round_amount"),
+    "employees": ("team", "total_employees"),
+    "tam": ("business", "market_size_tam"),
+}
+
+DOC_TYPE_PRIORITY = {"pitch_deck": 0, "update": 1, "email": 2, "transcript": 3}
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+PERIOD_PATTERNS = [
+    ("month", re.compile(
+        r"\b(?P<mon>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+(?P<year>20\d{2})\b",
+        re.IGNORECASE)),
+    ("month", re.compile(r"\b(?P<year>20\d{2})[-_/.](?P<mm>0[1-9]|1[0-2])\b")),
+    ("quarter", re.compile(r"\bQ(?P<q>[1-4])\s?(?:FY\s?)?'?(?P<year>(?:20)?\d{2})\b", re.IGNORECASE)),
+    ("year", re.compile(r"\b(?:FY\s?|in\s)?(?P<year>20\d{2})\b", re.IGNORECASE)),
+]
+
+# How far around a value to look for the period it refers to
+PERIOD_WINDOW = 80
+
+# Leading characters of a document searched for the period it covers
+DOCUMENT_PERIOD_HEAD = 300
+
+
+def parse_number(num, scale=None):
+    """'2,500' -> 2500.0, ('2.5', 'M') -> 2500000.0"""
+    value = float(num.replace(",", ""))
+    if scale:
+        value *= SCALES.get(scale.lower(), 1)
+    return value
+
+
+def find_period(text, start, end):
+    """
+    Normalized period closest to a value: "2024-03", "2024-Q3" or "2024"
+
+    The nearest mention wins; at equal distance a month beats a quarter
+    beats a bare year. The claim itself (text[start:end]) is not searched,
+    so the "2000" in "2000 customers" is not taken for a year.
+    """
+    window_start = max(0, start - PERIOD_WINDOW)
+    window = text[window_start:end + PERIOD_WINDOW]
+    centre = (start + end) / 2 - window_start
+
+    candidates = []
+    claimed = [(start - window_start, end - window_start)]
+    for rank, (kind, pattern) in enumerate(PERIOD_PATTERNS):
+        for match in pattern.finditer(window):
+            # The year inside "March 2024" is not a separate mention, nor is a number in the claim
+            if any(match.start() < e and s < match.end() for s, e in claimed):
+                continue
+            claimed.append(match.span())
+            distance = abs((match.start() + match.end()) / 2 - centre)
+            candidates.append((distance, rank, kind, match))
+    if not candidates:
+        return None
+
+    _, _, kind, match = min(candidates, key=lambda c: (c[0], c[1]))
+    year = match.group("year")
+    year = f"20{year}" if len(year) == 2 else year
+    if kind == "month":
+        if match.groupdict().get("mm"):
+            return f"{year}-{match.group('mm')}"
+        return f"{year}-{MONTHS[match.group('mon')[:3].lower()]:02d}"
+    if kind == "quarter":
+        return f"{year}-Q{match.group('q')}"
+    return year
+
+
+def document_period(text, filename=""):
+    """
+    Period a whole document reports on, e.g. "2024-03" for an update titled
+    "March 2024 Investor Update" or named "update_2024-03.pdf"
+    """
+    head = f"{filename}\n{(text or '')[:DOCUMENT_PERIOD_HEAD]}"
+    return find_period(head, 0, 0)
+
+
+def extract_facts(text, chunk_id=None, metadata=None):
+    """
+    Find literal numeric claims ("$2.5M ARR", "18 months runway", "1,200 customers") in one chunk
+
+    Returns:
+        List of fact dicts: metric, value (normalized float), unit
+        (USD/EUR/GBP/INR, count, months, percent), raw match text, the
+        period it refers to (or None) and the source chunk_id / doc_type / page_number
+    """
+    metadata = metadata or {}
+    facts = []
+    seen_spans = set()
+    for metric, kind, pattern in METRIC_PATTERNS:
+        for match in pattern.finditer(text):
+            span = (metric, match.start("num"))
+            if span in seen_spans:
+                continue
+            seen_spans.add(span)
+
+            groups = match.groupdict()
+            try:
+                value = parse_number(groups["num"], groups.get("scale"))
+            except ValueError:
+                continue
+
+            unit = CURRENCIES[groups["cur"]] if kind == "money" else kind
+            fact = {
+                "metric": metric,
+                "value": value,
+                "unit": unit,
+                "raw": match.group(0).strip(),
+                "chunk_id": chunk_id,
+                "doc_type": metadata.get("doc_type"),
+            }
+            if "page_number" in metadata:
+                fact["page_number"] = metadata["page_number"]
+            if "filename" in metadata:
+                fact["filename"] = metadata["filename"]
+            if "date" in metadata:
+                fact["date"] = metadata["date"]
+            
+            # Period the claim refers to: stated next to it, else the document's
+            # reporting period (updates), else the email's send month
+            period = find_period(text, match.start(), match.end()) or metadata.get("period")
+            if period is None and "date" in metadata:
+                period = metadata["date"][:7]
+            fact["period"] = period
+            facts.append(fact)
+    return facts
+
+
+def format_value(value):
+    """2500000.0 -> '2,500,000', 2.1 -> '2.1'"""
+    return f"{value:,.0f}" if value >= 1000 else f"{value:g}"
+
+
+def best_values(facts):
+    """
+    Pick one value per metric: the most frequently stated one, ties going
+    to the pitch deck, then updates, emails and transcripts
+    """
+    by_metric = {}
+    for fact in facts:
+        by_metric.setdefault(fact["metric"], []).append(fact)
+
+    best = {}
+    for metric, metric_facts in by_metric.items():
+        counts = Counter((f["value"], f["unit"]) for f in metric_facts)
+        chosen = min(
+            metric_facts,
+            key=lambda f: (-counts[(f["value"], f["unit"])], DOC_TYPE_PRIORITY.get(f["doc_type"], 9))
+        )
+        best[metric] = chosen
+    return best
+
+
+def prefill_fields(facts):
+    """
+    Turn facts into DataExtractionAgent fields, e.g. {"metrics": {"arr": 2500000.0}}
+
+    Percentages become "15%" strings to match the agent's schema.
+    """
+    fields = {}
+    for metric, fact in best_values(facts).items():
+        if metric not in FIELD_TARGETS:
+            continue
+        section, key = FIELD_TARGETS[metric]
+        value = fact["value"]
+        if fact["unit"] == "percent":
+            value = f"{value:g}%"
+        elif section == "business":
+            value = f"{format_value(value)} {fact['unit']}"
+        elif fact["unit"] in ("count", "months"):
+            value = int(value) if value.is_integer() else value
+        fields.setdefault(section, {})[key] = value
+    return fields
+
+
+def format_facts_table(facts, limit=40):
+    """Compact one-line-per-fact summary for LLM prompts"""
+    lines = []
+    for metric, fact in sorted(best_values(facts).items()):
+        source = fact["doc_type"] or "document"
+        if "page_number" in fact:
+            source += f" p.{fact['page_number']}"
+        lines.append(f"- {metric}: {format_value(fact['value'])} {fact['unit']} (\"{fact['raw']}\", {source})")
+    return "\n".join(lines[:limit])
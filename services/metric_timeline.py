@@ -0,0 +1,180 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+from services.metric_extractor import format_value
+
+# Metrics tracked month by month from founder updates
+TIMELINE_METRICS = ("mrr", "customers", "burn_rate_monthly", "employees", "runway_months")
+
+# Metrics whose growth (MoM, CMGR) is reported; the rest get a linear trend
+GROWTH_METRICS = ("mrr", "customers", "employees")
+
+# Only periods at least this precise can be placed on a monthly axis
+MONTH_PERIOD = re.compile(r"^(?P<year>\d{4})-(?P<month>\d{2})$")
+QUARTER_PERIOD = re.compile(r"^(?P<year>\d{4})-Q(?P<q>[1-4])$")
+
+# CMGR thresholds for the growth trajectory label
+TRAJECTORY_THRESHOLDS = [(0.15, "Exponential"), (0.02, "Linear"), (-0.02, "Stagnant")]
+
+
+def period_to_month(period):
+    """'2024-03' -> months since year 0; a quarter maps to its last month; anything coarser -> None"""
+    if not period:
+        return None
+    match = MONTH_PERIOD.match(period)
+    if match:
+        return int(match.group("year")) * 12 + int(match.group("month")) - 1
+    match = QUARTER_PERIOD.match(period)
+    if match:
+        return int(match.group("year")) * 12 + int(match.group("q")) * 3 - 1
+    return None
+
+
+def month_label(month):
+    """Inverse of period_to_month: 24290 -> '2024-03'"""
+    return f"{month // 12}-{month % 12 + 1:02d}"
+
+
+def _series(facts, metric):
+    """
+    One value per month for a metric: the median of that month's claims,
+    in the unit most of the claims use
+
+    Returns:
+        (months, values) NumPy arrays sorted by month
+    """
+    metric_facts = [f for f in facts if f["metric"] == metric]
+    if metric == "mrr":
+        # An update that only states ARR still gives an MRR point
+        metric_facts += [{**f, "value": f["value"] / 12} for f in facts if f["metric"] == "arr"]
+
+    by_month = {}
+    if metric_facts:
+        unit = Counter(f["unit"] for f in metric_facts).most_common(1)[0][0]
+        for fact in metric_facts:
+            month = period_to_month(fact.get("period"))
+            if month is not None and fact["unit"] == unit:
+                by_month.setdefault(month, []).append(fact["value"])
+
+    months = np.array(sorted(by_month), dtype=np.int64)
+    values = np.array([np.median(by_month[m]) for m in months], dtype=np.float64)
+    return months, values
+
+
+def growth_stats(months, values):
+    """
+    Month-over-month growth between consecutive points (normalized per
+    month when updates skip months) and compound monthly growth rate
+    """
+    positive = values > 0
+    months, values = months[positive], values[positive]
+    if len(values) < 2:
+        return {"latest_mom": None, "average_mom": None, "cmgr": None}
+
+    gaps = np.diff(months)
+    mom = (values[1:] / values[:-1]) ** (1 / gaps) - 1
+    cmgr = (values[-1] / values[0]) ** (1 / (months[-1] - months[0])) - 1
+    return {
+        "latest_mom": round(float(mom[-1]), 4),
+        "average_mom": round(float(mom.mean()), 4),
+        "cmgr": round(float(cmgr), 4),
+    }
+
+
+def linear_trend(months, values):
+    """Least-squares change per month (None with fewer than two points)"""
+    if len(values) < 2:
+        return None
+    slope, _ = np.polyfit(months - months[0], values, 1)
+    return round(float(slope), 2)
+
+
+def build_timeline(facts):
+    """
+    Dated series of key metrics from founder updates, with growth computed locally
+
+    Only facts from "update" documents whose period resolves to a month or
+    quarter are used.
+
+    Returns:
+        dict with "series" (metric -> [{"period", "value"}]), "growth"
+        (metric -> latest_mom / average_mom / cmgr), "burn_trend_per_month",
+        "runway" (latest months and trend per month), "months_covered"
+        and a "growth_trajectory" label derived from MRR (else customers) CMGR
+    """
+    update_facts = [f for f in facts if f.get("doc_type") == "update"]
+
+    timeline = {"series": {}, "growth": {}, "burn_trend_per_month": None,
+                "runway": {"latest_months": None, "trend_per_month": None},
+                "months_covered": [], "growth_trajectory": None}
+    covered = set()
+    for metric in TIMELINE_METRICS:
+        months, values = _series(update_facts, metric)
+        if not len(months):
+            continue
+        covered.update(months.tolist())
+        timeline["series"][metric] = [
+            {"period": month_label(m), "value": round(float(v), 2)} for m, v in zip(months, values)
+        ]
+
+        if metric in GROWTH_METRICS:
+            timeline["growth"][metric] = growth_stats(months, values)
+        elif metric == "burn_rate_monthly":
+            timeline["burn_trend_per_month"] = linear_trend(months, values)
+        elif metric == "runway_months":
+            timeline["runway"] = {
+                "latest_months": round(float(values[-1]), 1),
+                "trend_per_month": linear_trend(months, values),
+            }
+
+    if covered:
+        timeline["months_covered"] = [month_label(min(covered)), month_label(max(covered))]
+
+    for metric in ("mrr", "customers"):
+        cmgr = timeline["growth"].get(metric, {}).get("cmgr")
+        if cmgr is not None:
+            timeline["growth_trajectory"] = next(
+                (label for threshold, label in TRAJECTORY_THRESHOLDS if cmgr >= threshold), "Declining"
+            )
+            break
+
+    return timeline
+
+
+def headline_growth(timeline):
+    """e.g. '12.4% CMGR in MRR (2024-01 to 2024-06)', or None without a usable series"""
+    for metric in ("mrr", "customers"):
+        cmgr = timeline["growth"].get(metric, {}).get("cmgr")
+        if cmgr is not None:
+            series = timeline["series"][metric]
+            return f"{cmgr:.1%} CMGR in {metric.upper() if metric == 'mrr' else metric} ({series[0]['period']} to {series[-1]['period']})"
+    return None
+
+
+def format_timeline(timeline):
+    """Compact text block for agent prompts"""
+    if not timeline["series"]:
+        return "No dated metrics found in founder updates."
+
+    lines = []
+    for metric, points in timeline["series"].items():
+        values = ", ".join(f"{p['period']}: {format_value(p['value'])}" for p in points)
+        lines.append(f"- {metric}: {values}")
+
+    for metric, stats in timeline["growth"].items():
+        if stats["cmgr"] is not None:
+            lines.append(
+                f"- {metric} growth: latest MoM {stats['latest_mom']:.1%}, "
+                f"average MoM {stats['average_mom']:.1%}, CMGR {stats['cmgr']:.1%}"
+            )
+    if timeline["burn_trend_per_month"] is not None:
+        lines.append(f"- burn trend: {timeline['burn_trend_per_month']:+,.0f} per month")
+    runway = timeline["runway"]
+    if runway["latest_months"] is not None:
+        trend = f", trend {runway['trend_per_month']:+.1f} months per month" if runway["trend_per_month"] is not None else ""
+        lines.append(f"- runway: {runway['latest_months']:g} months{trend}")
+    if timeline["growth_trajectory"]:
+        lines.append(f"- trajectory (from CMGR): {timeline['growth_trajectory']}")
+    return "\n".join(lines)
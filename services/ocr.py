@@ -0,0 +1,149 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+
+from pypdf import PdfReader
+
+from config import (
+    OCR_CACHE_DIR, OCR_DEADLINE_SECONDS, OCR_DPI, OCR_LANG, OCR_MAX_WORKERS, OCR_MIN_CHARS, OCR_START_METHOD,
+    PARSE_MEMORY_LIMIT_MB
+)
+from services.parse_sandbox import limit_memory, skip_main_reimport
+
+# Set once per worker process by _init_worker
+_worker_pdf = None
+_worker_reader = None
+
+
+def needs_ocr(text):
+    """A page with (almost) no text layer is probably a slide image"""
+    return len(text.strip()) < OCR_MIN_CHARS
+
+
+def page_fingerprint(page):
+    """Hash of a page's content stream and image data, stable across re-uploads of the same slide"""
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if xobjects:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            xobject = xobjects[name].get_object()
+            digest.update(name.encode())
+            digest.update(xobject.get_data())
+    return digest.hexdigest()
+
+
+def _init_worker(pdf_bytes, memory_limit_mb):
+    global _worker_pdf, _worker_reader
+    import pypdfium2 as pdfium
+    limit_memory(memory_limit_mb)
+    _worker_pdf = pdfium.PdfDocument(pdf_bytes)
+    _worker_reader = PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _ocr_page(page_number):
+    """
+    Text of one page from the cache, else rasterized and run through
+    Tesseract (runs in a worker process, like the fingerprinting: a hostile
+    PDF's streams are only ever decompressed under the worker's limits)
+
+    Returns:
+        (page_number, text or None, cached, error or None)
+    """
+    try:
+        path = _cache_path(page_fingerprint(_worker_reader.pages[page_number - 1]))
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return page_number, f.read(), True, None
+
+        import pytesseract
+        page = _worker_pdf[page_number - 1]
+        try:
+            image = page.render(scale=OCR_DPI / 72).to_pil().convert("L")
+        finally:
+            page.close()
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return page_number, text, False, None
+    except Exception as e:
+        return page_number, None, False, f"{type(e).__name__}: {e}"
+
+
+def _cache_path(fingerprint):
+    return os.path.join(OCR_CACHE_DIR, f"{fingerprint}.txt")
+
+
+def ocr_pages(pdf_bytes, page_numbers, deadline_seconds=OCR_DEADLINE_SECONDS):
+    """
+    OCR the given pages of a PDF in a pool of memory-limited worker processes
+
+    Results are cached on disk by page fingerprint, so re-uploading a deck
+    skips recognition entirely. The PDF is only opened in the workers. Pages
+    still running when deadline_seconds elapses are given up on and the
+    workers killed.
+
+    Returns:
+        dict page_number -> recognized text (missing pages were not recognized)
+    """
+    try:
+        import pytesseract
+        import pypdfium2  # noqa: F401
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        print(f"⚠️ OCR unavailable, skipping {len(page_numbers)} image-only pages: {e}")
+        return {}
+    if deadline_seconds <= 0:
+        print(f"⚠️ No time left for OCR, skipping {len(page_numbers)} image-only pages")
+        return {}
+
+    started = time.perf_counter()
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    context = multiprocessing.get_context(OCR_START_METHOD)
+    # Workers are started by Pool()
+    with skip_main_reimport():
+        pool = context.Pool(
+            processes=min(OCR_MAX_WORKERS, len(page_numbers)),
+            initializer=_init_worker,
+            initargs=(bytes(pdf_bytes), PARSE_MEMORY_LIMIT_MB)
+        )
+
+    recognized = {}
+    cached = 0
+    timed_out = False
+    try:
+        results = pool.imap_unordered(_ocr_page, page_numbers)
+        deadline = started + deadline_seconds
+        for _ in page_numbers:
+            try:
+                page_number, text, from_cache, error = results.next(timeout=max(0.0, deadline - time.perf_counter()))
+            except multiprocessing.TimeoutError:
+                timed_out = True
+                break
+            if error:
+                print(f"⚠️ OCR failed on page {page_number}: {error}")
+                continue
+            recognized[page_number] = text
+            cached += from_cache
+
+        if timed_out:
+            print(f"⚠️ OCR deadline of {deadline_seconds:.0f}s hit, "
+                  f"{len(page_numbers) - len(recognized)} pages left without text")
+    finally:
+        # terminate() also kills workers still inside Tesseract; close() lets idle ones exit
+        if timed_out:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+
+    print(f"✅ OCR recognized {len(recognized)}/{len(page_numbers)} pages ({cached} from cache) "
+          f"in {time.perf_counter() - started:.1f}s")
+    return recognized
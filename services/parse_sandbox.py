@@ -0,0 +1,178 @@
+import io
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import docx2txt
+
+from config import PARSE_DEADLINE_SECONDS, PARSE_MEMORY_LIMIT_MB, PARSE_START_METHOD
+from services.pdf_engines import get_pdf_engine
+
+
+# Modules imported once by the fork server, so workers start with the parsers loaded
+PRELOAD_MODULES = [__name__, "services.pdf_engines", "pypdf", "pypdfium2", "docx2txt", "services.email_loader"]
+
+
+def decode_text(raw):
+    """UTF-8 with a latin-1 fallback, so any byte string decodes"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def iter_parsed_pages(kind, stream, engine_name=None):
+    """
+    Yield (page_number, text): one item per PDF page, a single
+    (None, text) item for a DOCX or plain-text file
+    """
+    if kind == "pdf":
+        yield from get_pdf_engine(engine_name).extract_pages(stream)
+    elif kind == "docx":
+        yield None, docx2txt.process(stream)
+    else:
+        yield None, decode_text(stream.read())
+
+
+def limit_memory(limit_mb):
+    """Cap the worker's address space (no-op where the resource module is missing, e.g. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker(results, kind, data, engine_name, memory_limit_mb):
+    """Parse in the sandbox process, streaming each page back as soon as it is extracted"""
+    limit_memory(memory_limit_mb)
+    try:
+        stream = open(data, "rb") if isinstance(data, str) else io.BytesIO(data)
+        with stream:
+            for page_number, text in iter_parsed_pages(kind, stream, engine_name):
+                results.put(("page", page_number, text))
+        results.put(("done", None, None))
+    except MemoryError:
+        results.put(("memory", None, f"exceeded {memory_limit_mb} MB"))
+    except Exception as e:
+        results.put(("error", None, f"{type(e).__name__}: {e}"))
+
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def skip_main_reimport():
+    """
+    Start worker processes without re-running __main__ in them
+
+    forkserver and spawn children re-import the parent's main script before
+    running their target. The workers only need their own (importable)
+    modules, and with the Streamlit app as __main__ that re-import costs
+    seconds per worker. __main__ is hidden for the duration of start().
+    """
+    main = sys.modules["__main__"]
+    with _main_lock:
+        main_file = main.__dict__.pop("__file__", None)
+        main_spec = getattr(main, "__spec__", None)
+        main.__spec__ = None
+        try:
+            yield
+        finally:
+            main.__spec__ = main_spec
+            if main_file is not None:
+                main.__file__ = main_file
+
+
+def _get_context():
+    context = multiprocessing.get_context(PARSE_START_METHOD)
+    if PARSE_START_METHOD == "forkserver":
+        # Import the parsers once in the fork server. Not __main__: every worker would re-import
+        # it, and with the Streamlit app (chromadb, the agents) that costs seconds per parse
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def parse_in_sandbox(kind, data, filename, engine_name=None,
+                     deadline_seconds=PARSE_DEADLINE_SECONDS, memory_limit_mb=PARSE_MEMORY_LIMIT_MB):
+    """
+    Parse one file in a separate process with a wall-clock deadline and memory ceiling
+
+    Pages are streamed back one at a time, so everything extracted before
+    a deadline, memory error or crash is kept. The worker is killed when the
+    deadline passes.
+
+    Args:
+        kind: "pdf", "docx" or "txt"
+        data: file bytes, or a path the worker opens itself
+        filename: display name for metrics and logs
+        engine_name: PDF engine to use in the worker
+
+    Returns:
+        (pages, metrics) where pages is a list of (page_number, text) and
+        metrics holds status (ok / deadline / memory / error / crashed),
+        pages, elapsed_seconds, error and exitcode
+    """
+    context = _get_context()
+    results = context.Queue()
+    process = context.Process(
+        target=_worker,
+        args=(results, kind, data, engine_name, memory_limit_mb),
+        daemon=True
+    )
+
+    started = time.perf_counter()
+    with skip_main_reimport():
+        process.start()
+
+    pages = []
+    status = None
+    error = None
+    deadline = started + deadline_seconds
+    while status is None:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            status = "deadline"
+            break
+        try:
+            message, page_number, payload = results.get(timeout=min(remaining, 0.5))
+        except queue.Empty:
+            # Died without reporting: killed by the OS or a native crash, often the memory ceiling
+            if not process.is_alive():
+                status = "crashed"
+            continue
+
+        if message == "page":
+            pages.append((page_number, payload))
+        elif message == "done":
+            status = "ok"
+        else:
+            status, error = message, payload
+
+    # A worker that reported back gets a moment to exit cleanly; anything else is killed
+    process.join(timeout=1 if status in ("ok", "error", "memory") else 0)
+    if process.is_alive():
+        process.kill()
+    process.join(timeout=5)
+    results.close()
+
+    metrics = {
+        "filename": filename,
+        "kind": kind,
+        "status": status,
+        "pages": len(pages),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        "error": error,
+        "exitcode": process.exitcode,
+    }
+    if status == "ok":
+        print(f"✅ Parsed {filename}: {len(pages)} pages in {metrics['elapsed_seconds']}s")
+    else:
+        print(f"⚠️ Parse of {filename} stopped ({status}{': ' + error if error else ''}), "
+              f"kept {len(pages)} pages after {metrics['elapsed_seconds']}s")
+    return pages, metrics
+
@@ -0,0 +1,67 @@
+from pypdf import PdfReader
+
+from config import PDF_ENGINE
+
+
+class PdfEngine:
+    """Text-extraction backend: yields (page_number, text) for each page, 1-based"""
+
+    name = None
+
+    def extract_pages(self, stream):
+        raise NotImplementedError
+
+
+class PypdfEngine(PdfEngine):
+    """Pure-Python extraction with pypdf (always available)"""
+
+    name = "pypdf"
+
+    def extract_pages(self, stream):
+        reader = PdfReader(stream)
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, page.extract_text() or ""
+
+
+class PdfiumEngine(PdfEngine):
+    """Native extraction with PDFium via pypdfium2, much faster on large decks"""
+
+    name = "pdfium"
+
+    def extract_pages(self, stream):
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(stream)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                text_page = page.get_textpage()
+                try:
+                    yield index + 1, text_page.get_text_range()
+                finally:
+                    text_page.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+
+PDF_ENGINES = {
+    PypdfEngine.name: PypdfEngine,
+    PdfiumEngine.name: PdfiumEngine,
+}
+
+
+def get_pdf_engine(name=None):
+    """Return the configured engine, falling back to pypdf if the backend is not installed"""
+    name = name or PDF_ENGINE
+    if name not in PDF_ENGINES:
+        raise ValueError(f"Unknown PDF engine '{name}', choose from {sorted(PDF_ENGINES)}")
+
+    if name == PdfiumEngine.name:
+        try:
+            import pypdfium2  # noqa: F401
+        except ImportError:
+            print("⚠️ pypdfium2 not installed, falling back to pypdf")
+            return PypdfEngine()
+
+    return PDF_ENGINES[name]()
@@ -2,17 +2,93 @@ import chromadb
 from chromadb.config import Settings
 import uuid
 import os
+import asyncio
+import json
+import numpy as np
+import time
+import random
+import threading
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
+from config import EMBEDDING_MODEL
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.dedup import NearDuplicateIndex
+from services.metric_extractor import document_period, extract_facts
+from services.metric_timeline import build_timeline
+from services.consistency_checker import check_consistency
+from services.circuit_breaker import CircuitOpenError, get_breaker
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 HF_TOKEN = os.getenv('HF_TOKEN')
 UPLOAD_FOLDER = "uploads"
 DATA_FOLDER = "data"
 CHROMA_DB_PATH = "./data/chroma_db"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Ingest batching: chunks per embedding request, requests in flight, retries per batch
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+EMBED_MAX_CONCURRENCY = int(os.getenv('EMBED_MAX_CONCURRENCY', '4'))
+EMBED_MAX_RETRIES = 3
+EMBED_RETRY_BACKOFF = 1.0
+
+# Hybrid retrieval: fuse BM25 with vector hits, fetching this many candidates per result
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+HYBRID_CANDIDATE_FACTOR = 3
+
+# Async API: embedding requests open at once per event loop
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '8'))
+
+# Drop near-duplicate chunks (footers, disclaimers, quoted email threads) before embedding
+DEDUP_CHUNKS = os.getenv('DEDUP_CHUNKS', 'true').lower() == 'true'
+
+def source_label(metadata):
+    """Short human-readable citation for a chunk, e.g. 'Slide 4: Traction' or 'update.pdf p.2'"""
+    if metadata.get('doc_type') == "pitch_deck" and 'page_number' in metadata:
+        title = metadata.get('slide_title')
+        return f"Slide {metadata['page_number']}: {title}" if title else f"Slide {metadata['page_number']}"
+    
+    label = metadata.get('filename', 'document')
+    if 'page_number' in metadata:
+        label += f" p.{metadata['page_number']}"
+    if metadata.get('date'):
+        label += f", {metadata['date']}"
+    return label
+
+
+class GuardedEmbeddings:
+    """
+    An embeddings client behind the "hf_embeddings" circuit breaker
+    
+    While the endpoint keeps failing, calls raise CircuitOpenError at once
+    instead of waiting out timeouts and retries.
+    """
+    
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.breaker = get_breaker("hf_embeddings")
+    
+    def embed_documents(self, texts):
+        return self.breaker.call(self.embeddings.embed_documents, texts)
+    
+    def embed_query(self, text):
+        return self.breaker.call(self.embeddings.embed_query, text)
+    
+    async def aembed_documents(self, texts):
+        return await self.breaker.acall(self.embeddings.aembed_documents, texts)
+    
+    async def aembed_query(self, text):
+        return await self.breaker.acall(self.embeddings.aembed_query, text)
+
 
 class RAGSystem:
     """RAG system using ChromaDB and Gemini embeddings"""
     
     def __init__(self):
+        # One embedding semaphore per event loop (asyncio primitives can't be shared across loops)
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        self._async_semaphores_lock = threading.Lock()
+        
         # Initialize ChromaDB
         self.client = chromadb.Client(Settings(
             persist_directory=CHROMA_DB_PATH,
@@ -20,11 +96,11 @@ class RAGSystem:
         ))
         
         # Initialize Gemini embeddings through LangChain
-        self.embeddings = HuggingFaceEndpointEmbeddings(
-                model="sentence-transformers/all-MiniLM-L6-v2",  # Use a proper embedding model
+        self.embeddings = GuardedEmbeddings(HuggingFaceEndpointEmbeddings(
+                model=EMBEDDING_MODEL,  # Use a proper embedding model
                  task="feature-extraction",
                   huggingfacehub_api_token=HF_TOKEN
-)
+))
         
         # Create or get collection
         try:
@@ -34,89 +110,376 @@ class RAGSystem:
                 name="startup_documents",
                 metadata={"description": "Startup analysis documents"}
             )
+        
+        # Lexical (BM25) index built next to the vectors at ingest
+        self.lexical = BM25Index()
+        
+        # MinHash/LSH near-duplicate detector and per-startup ingest counters
+        self.dedup = NearDuplicateIndex()
+        self.ingest_stats = {}
+        # Dropped copies (id, text, metadata) by startup and kept chunk id, stored
+        # in its place if the kept chunk is deleted or fails to be indexed
+        self._dropped = defaultdict(lambda: defaultdict(list))
+        
+        # Per-startup table of literal numeric claims, built at ingest
+        self.metric_facts = defaultdict(list)
+        self._facts_lock = threading.Lock()
+        
+        # Centroid read-modify-writes are serialized per startup (concurrent ingests and deletes)
+        self._centroid_locks = defaultdict(threading.Lock)
+        
+        # Small side index: one centroid vector per startup for "similar deck" lookups
+        try:
+            self.centroids = self.client.get_collection("startup_centroids")
+        except:
+            self.centroids = self.client.create_collection(
+                name="startup_centroids",
+                metadata={"description": "Per-startup centroid embeddings", "hnsw:space": "cosine"}
+            )
     
-    def add_documents(self, extracted_data, startup_id):
+    def add_documents(self, extracted_data, startup_id, progress_callback=None):
         """
         Add all documents to vector database
         
         Args:
             extracted_data: dict from DocumentProcessor
             startup_id: unique identifier for this startup
+            progress_callback: optional callable(done_chunks, total_chunks)
+        """
+        all_chunks, metadatas, ids = self._build_records(extracted_data, startup_id)
+        all_chunks, metadatas, ids = self._drop_near_duplicates(startup_id, all_chunks, metadatas, ids)
+        
+        # Create embeddings and add to ChromaDB in bounded, retried batches
+        if all_chunks:
+            added = self._ingest_batches(startup_id, all_chunks, metadatas, ids, progress_callback)
+            
+            print(f"✅ Added {added} chunks to RAG system")
+            return added
+        
+        return 0
+    
+    def add_document(self, document, doc_type, startup_id, doc_key, progress_callback=None, part=None):
+        """
+        Add a single document, e.g. one upload ingested in the background
+        
+        Args:
+            document: SourceDocument from DocumentProcessor
+            doc_type: "pitch_deck", "transcript", "email" or "update"
+            startup_id: unique identifier for this startup
+            doc_key: stable key of the document (e.g. its content hash); chunk
+                ids derive from it and delete_document removes by it
+            progress_callback: optional callable(done_chunks, total_chunks)
+            part: index of this document within a file added in several
+                parts (e.g. groups of an email archive); all parts share doc_key
         """
+        id_prefix = f"{startup_id}_{doc_type}_{doc_key}"
+        extra = {"doc_key": doc_key}
+        if part:
+            id_prefix = f"{id_prefix}_p{part}"
+            extra["part"] = part
+        chunks, metadatas, ids = self._document_records(document, doc_type, startup_id, id_prefix, extra)
+        chunks, metadatas, ids = self._drop_near_duplicates(startup_id, chunks, metadatas, ids)
+        if not chunks:
+            return 0
+        
+        added = self._ingest_batches(startup_id, chunks, metadatas, ids, progress_callback)
+        print(f"✅ Added {added} chunks of {document.filename} to RAG system")
+        return added
+    
+    def delete_document(self, startup_id, doc_key, doc_type):
+        """
+        Remove every chunk of one document added with add_document, from
+        Chroma and from the local indexes, and take it out of the centroid
+        
+        doc_type is part of the match: the same file uploaded as, say, a
+        transcript and an email has one doc_key but is two documents.
+        
+        Returns:
+            Number of chunks removed
+        """
+        try:
+            existing = self.collection.get(
+                where=self._where(startup_id, {"doc_key": doc_key, "doc_type": doc_type}),
+                include=["embeddings"]
+            )
+            ids = existing['ids']
+            if not ids:
+                return 0
+            
+            self.collection.delete(ids=ids)
+            self.lexical.remove(startup_id, ids)
+            self.dedup.remove(startup_id, ids)
+            removed = set(ids)
+            with self._facts_lock:
+                self.metric_facts[startup_id] = [
+                    fact for fact in self.metric_facts[startup_id] if fact['chunk_id'] not in removed
+                ]
+                # This document's own dropped copies go with it
+                for copies in self._dropped[startup_id].values():
+                    copies[:] = [
+                        copy for copy in copies
+                        if (copy[2].get("doc_key"), copy[2].get("doc_type")) != (doc_key, doc_type)
+                    ]
+            
+            vectors = np.asarray(existing['embeddings'], dtype=np.float32)
+            self._update_centroid(startup_id, -vectors.sum(axis=0), -len(ids))
+            
+            print(f"🗑️ Removed {len(ids)} chunks of {doc_type} {doc_key}")
+            # Copies in other documents that were dropped in favour of these chunks
+            self._restore_duplicates(startup_id, ids)
+            return len(ids)
+        except Exception as e:
+            print(f"❌ Error removing document {doc_key}: {e}")
+            return 0
+    
+    def _document_records(self, document, doc_type, startup_id, id_prefix, extra_metadata=None):
+        """Parallel chunk view / metadata / id lists for one SourceDocument"""
+        chunks = []
+        metadatas = []
+        ids = []
+        
+        # Founder updates report on one month or quarter, usually named in the title
+        period = document_period(document.text, document.filename) if doc_type == "update" else None
+        for i, chunk in enumerate(document.chunks):
+            metadata = {"startup_id": startup_id, "doc_type": doc_type, **(extra_metadata or {})}
+            if period:
+                metadata["period"] = period
+            # Loader provenance: page / slide title / offsets, email sender / date
+            metadata.update({"chunk_index": i, "filename": document.filename, **chunk.provenance()})
+            
+            # Chunk views stay offsets into the document until their batch is embedded
+            chunks.append(chunk)
+            metadatas.append(metadata)
+            ids.append(f"{id_prefix}_{i}")
+        
+        return chunks, metadatas, ids
+    
+    def _build_records(self, extracted_data, startup_id):
+        """Flatten extracted_data (SourceDocuments) into parallel chunk view / metadata / id lists"""
         all_chunks = []
         metadatas = []
         ids = []
         
+        def add_document(document, doc_type, id_prefix, doc_idx=None):
+            extra = {"doc_index": doc_idx} if doc_idx is not None else None
+            records = self._document_records(document, doc_type, startup_id, id_prefix, extra)
+            for collected, new in zip((all_chunks, metadatas, ids), records):
+                collected.extend(new)
+        
         # Add pitch deck chunks
-        if extracted_data['pitch_deck']['chunks']:
-            for i, chunk in enumerate(extracted_data['pitch_deck']['chunks']):
-                all_chunks.append(chunk)
-                metadatas.append({
-                    "startup_id": startup_id,
-                    "doc_type": "pitch_deck",
-                    "chunk_index": i,
-                    "filename": extracted_data['pitch_deck']['filename']
-                })
-                ids.append(f"{startup_id}_pitch_{i}")
+        if extracted_data['pitch_deck']:
+            add_document(extracted_data['pitch_deck'], "pitch_deck", f"{startup_id}_pitch")
         
         # Add transcript chunks
         for doc_idx, transcript in enumerate(extracted_data['transcripts']):
-            for i, chunk in enumerate(transcript['chunks']):
-                all_chunks.append(chunk)
-                metadatas.append({
-                    "startup_id": startup_id,
-                    "doc_type": "transcript",
-                    "doc_index": doc_idx,
-                    "chunk_index": i,
-                    "filename": transcript['filename']
-                })
-                ids.append(f"{startup_id}_transcript_{doc_idx}_{i}")
+            add_document(transcript, "transcript", f"{startup_id}_transcript_{doc_idx}", doc_idx)
         
         # Add email chunks
         for doc_idx, email in enumerate(extracted_data['emails']):
-            for i, chunk in enumerate(email['chunks']):
-                all_chunks.append(chunk)
-                metadatas.append({
-                    "startup_id": startup_id,
-                    "doc_type": "email",
-                    "doc_index": doc_idx,
-                    "chunk_index": i,
-                    "filename": email['filename']
-                })
-                ids.append(f"{startup_id}_email_{doc_idx}_{i}")
+            add_document(email, "email", f"{startup_id}_email_{doc_idx}", doc_idx)
         
         # Add update chunks
         for doc_idx, update in enumerate(extracted_data['updates']):
-            for i, chunk in enumerate(update['chunks']):
-                all_chunks.append(chunk)
-                metadatas.append({
-                    "startup_id": startup_id,
-                    "doc_type": "update",
-                    "doc_index": doc_idx,
-                    "chunk_index": i,
-                    "filename": update['filename']
-                })
-                ids.append(f"{startup_id}_update_{doc_idx}_{i}")
+            add_document(update, "update", f"{startup_id}_update_{doc_idx}", doc_idx)
         
-        # Create embeddings and add to ChromaDB
-        if all_chunks:
-            # Create embeddings using LangChain
-            embeddings_list = self.embeddings.embed_documents(all_chunks)
-            
-            # Add to ChromaDB
-            self.collection.add(
-                documents=all_chunks,
-                embeddings=embeddings_list,
-                metadatas=metadatas,
-                ids=ids
+        return all_chunks, metadatas, ids
+    
+    def _drop_near_duplicates(self, startup_id, chunks, metadatas, ids):
+        """
+        Collapse near-identical chunks across all of a startup's documents
+        
+        The first copy is kept and records how many copies were dropped in
+        its "duplicate_count" metadata; the counts also go to self.ingest_stats.
+        """
+        with self._facts_lock:
+            stats = self.ingest_stats.setdefault(
+                startup_id, {"chunks_seen": 0, "duplicates_dropped": 0, "dedupe_ratio": 0.0}
             )
+            stats["chunks_seen"] += len(chunks)
+        if not DEDUP_CHUNKS or not chunks:
+            return chunks, metadatas, ids
+        
+        kept, duplicates = self.dedup.filter(startup_id, ids, chunks)
+        if not duplicates:
+            return chunks, metadatas, ids
+        
+        copies = defaultdict(int)
+        for original in duplicates.values():
+            copies[original] += 1
+        
+        positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        with self._facts_lock:
+            for duplicate, original in duplicates.items():
+                i = positions[duplicate]
+                self._dropped[startup_id][original].append((duplicate, str(chunks[i]), metadatas[i]))
+        
+        kept_metadatas = []
+        for i in kept:
+            metadata = metadatas[i]
+            if ids[i] in copies:
+                metadata = {**metadata, "duplicate_count": copies[ids[i]]}
+            kept_metadatas.append(metadata)
+        
+        with self._facts_lock:
+            stats["duplicates_dropped"] += len(duplicates)
+            stats["dedupe_ratio"] = round(stats["duplicates_dropped"] / stats["chunks_seen"], 3)
+        print(f"🧹 Dropped {len(duplicates)} of {len(chunks)} chunks as near-duplicates ({len(duplicates) / len(chunks):.0%})")
+        
+        return [chunks[i] for i in kept], kept_metadatas, [ids[i] for i in kept]
+    
+    def _restore_duplicates(self, startup_id, original_ids):
+        """
+        Ingest the dropped copies of chunks that are no longer stored, so a
+        document still uploaded keeps its text when the copy it matched goes
+        
+        Returns:
+            Number of chunks added back
+        """
+        with self._facts_lock:
+            dropped = self._dropped.get(startup_id, {})
+            orphans = [copy for original in original_ids for copy in dropped.pop(original, [])]
+            if orphans:
+                # They are counted again by _drop_near_duplicates
+                stats = self.ingest_stats[startup_id]
+                stats["chunks_seen"] -= len(orphans)
+                stats["duplicates_dropped"] -= len(orphans)
+                seen = stats["chunks_seen"]
+                stats["dedupe_ratio"] = round(stats["duplicates_dropped"] / seen, 3) if seen else 0.0
+        if not orphans:
+            return 0
+        
+        ids, texts, metadatas = (list(column) for column in zip(*orphans))
+        texts, metadatas, ids = self._drop_near_duplicates(startup_id, texts, metadatas, ids)
+        added = self._ingest_batches(startup_id, texts, metadatas, ids) if texts else 0
+        print(f"♻️ Restored {added} chunks that had been dropped as copies of removed ones")
+        return added
+    
+    def _discard_batch(self, startup_id, ids):
+        """Undo the dedup bookkeeping of a batch that could not be stored"""
+        self.dedup.discard(startup_id, ids)
+        self._restore_duplicates(startup_id, ids)
+    
+    def _ingest_batches(self, startup_id, chunks, metadatas, ids, progress_callback=None):
+        """
+        Embed and insert chunks batch by batch
+        
+        At most EMBED_MAX_CONCURRENCY embedding requests are in flight, each
+        batch is retried with exponential backoff, and a batch that still
+        fails is skipped instead of aborting the whole upload.
+        
+        Returns:
+            Number of chunks actually added
+        """
+        batch_size = max(1, min(EMBED_BATCH_SIZE, self._max_batch_size()))
+        batches = [
+            (start, min(start + batch_size, len(chunks)))
+            for start in range(0, len(chunks), batch_size)
+        ]
+        
+        added = 0
+        failed_batches = []
+        vector_sum = None
+        
+        with ThreadPoolExecutor(max_workers=EMBED_MAX_CONCURRENCY) as pool:
+            batch_iter = iter(batches)
+            in_flight = {}
             
-            print(f"✅ Added {len(all_chunks)} chunks to RAG system")
-            return len(all_chunks)
+            def submit_next():
+                batch = next(batch_iter, None)
+                if batch is not None:
+                    start, end = batch
+                    future = pool.submit(self._embed_batch, chunks[start:end])
+                    in_flight[future] = batch
+            
+            # Keep a small window in flight so finished embeddings never pile up in memory
+            for _ in range(EMBED_MAX_CONCURRENCY * 2):
+                submit_next()
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = in_flight.pop(future)
+                    try:
+                        texts, vectors = future.result()
+                        self._with_retries(
+                            self.collection.add,
+                            documents=texts,
+                            embeddings=vectors,
+                            metadatas=metadatas[start:end],
+                            ids=ids[start:end]
+                        )
+                        self._index_batch(startup_id, ids[start:end], texts, metadatas[start:end])
+                        added += end - start
+                        batch_sum = np.asarray(vectors, dtype=np.float32).sum(axis=0)
+                        vector_sum = batch_sum if vector_sum is None else vector_sum + batch_sum
+                    except Exception as e:
+                        print(f"❌ Batch {start}-{end} failed after {EMBED_MAX_RETRIES} retries: {e}")
+                        failed_batches.append((start, end))
+                        self._discard_batch(startup_id, ids[start:end])
+                    
+                    if progress_callback:
+                        progress_callback(added, len(chunks))
+                    submit_next()
         
-        return 0
+        if failed_batches:
+            print(f"⚠️ {len(failed_batches)} of {len(batches)} batches could not be indexed")
+        
+        if added:
+            self._update_centroid(startup_id, vector_sum, added)
+        
+        return added
+    
+    def _embed_batch(self, chunks):
+        """Materialize one batch of chunk views into strings and embed them"""
+        texts = [str(chunk) for chunk in chunks]
+        return texts, self._with_retries(self.embeddings.embed_documents, texts)
+    
+    def _index_batch(self, startup_id, ids, chunks, metadatas):
+        """Local side indexes fed from every stored batch: near-duplicate signatures, BM25 terms and numeric facts"""
+        self.dedup.commit(startup_id, ids)
+        self.lexical.add(startup_id, ids, chunks, metadatas)
+        
+        facts = []
+        for chunk_id, chunk, metadata in zip(ids, chunks, metadatas):
+            facts.extend(extract_facts(chunk, chunk_id, metadata))
+        with self._facts_lock:
+            self.metric_facts[startup_id].extend(facts)
+    
+    def get_metric_facts(self, startup_id):
+        """Numeric facts (MRR, ARR, burn, runway, ...) found in this startup's chunks at ingest"""
+        with self._facts_lock:
+            return list(self.metric_facts.get(startup_id, []))
+    
+    def get_consistency_findings(self, startup_id):
+        """Metrics stated with conflicting values for the same period, across all of the startup's documents"""
+        return check_consistency(self.get_metric_facts(startup_id))
+    
+    def get_metric_timeline(self, startup_id):
+        """Dated MRR / customers / burn / headcount series from founder updates, with growth computed locally"""
+        return build_timeline(self.get_metric_facts(startup_id))
+    
+    def _with_retries(self, fn, *args, **kwargs):
+        """Call fn, retrying transient failures with exponential backoff and jitter"""
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                delay = EMBED_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+                print(f"⚠️ {getattr(fn, '__name__', 'call')} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def _max_batch_size(self):
+        """Largest insert Chroma accepts in a single call"""
+        try:
+            return self.client.get_max_batch_size()
+        except Exception:
+            return EMBED_BATCH_SIZE
     
-    def query(self, question, startup_id, n_results=5):
+    def query(self, question, startup_id, n_results=5, where=None, cite=False):
         """
         Query the RAG system
         
@@ -124,6 +487,8 @@ class RAGSystem:
             question: The question to ask
             startup_id: Filter by startup
             n_results: Number of results to return
+            where: Optional extra metadata filter, e.g. {"page_number": {"$in": [4, 5]}}
+            cite: Prefix each chunk with its source (slide number and title, file, date)
         
         Returns:
             Combined context from relevant chunks
@@ -132,49 +497,530 @@ class RAGSystem:
             # Create query embedding
             query_embedding = self.embeddings.embed_query(question)
             
-            # Query ChromaDB
+            # Query ChromaDB (extra candidates so lexical fusion has room to re-rank)
             results = self.collection.query(
                 query_embeddings=[query_embedding],
-                n_results=n_results,
-                where={"startup_id": startup_id}
+                n_results=self._candidate_count(n_results),
+                where=self._where(startup_id, where)
             )
             
-            if results['documents'] and results['documents'][0]:
-                # Combine relevant chunks
-                context = "\n\n---\n\n".join(results['documents'][0])
-                return context
-            
-            return ""
+            # Fuse with BM25 and combine relevant chunks
+            return self._combine_results(results, question, startup_id, n_results, where, cite)
             
         except Exception as e:
             print(f"❌ Error querying RAG: {e}")
             return ""
     
+    def embed_questions(self, questions):
+        """Embed distinct questions in a single request: question -> vector"""
+        unique = list(dict.fromkeys(questions))
+        if not unique:
+            return {}
+        return dict(zip(unique, self._with_retries(self.embeddings.embed_documents, unique)))
+    
+    def query_batch(self, specs, startup_id, question_vectors=None):
+        """
+        Resolve many retrieval questions in one batched pass
+        
+        Identical specs are answered once, every question is embedded in a
+        single request (unless question_vectors already has it), and questions
+        sharing a metadata filter go to Chroma as one multi-embedding query.
+        
+        Args:
+            specs: dict key -> {"question", "n_results" (default 5), "where",
+                "slide_keywords" (as in query_slides), "cite"}
+            startup_id: Filter by startup
+            question_vectors: optional question -> vector from embed_questions
+        
+        Returns:
+            dict key -> combined context, as query() would return it
+        """
+        try:
+            vectors = dict(question_vectors or {})
+            vectors.update(self.embed_questions(
+                spec['question'] for spec in specs.values() if spec['question'] not in vectors
+            ))
+            
+            # De-duplicate specs, then group them by the filter they search under
+            groups = defaultdict(dict)
+            slide_pages = {}
+            for spec in specs.values():
+                where = spec.get('where')
+                keywords = tuple(spec.get('slide_keywords') or ())
+                if keywords:
+                    if keywords not in slide_pages:
+                        slide_pages[keywords] = self.find_slides(startup_id, list(keywords))
+                    if slide_pages[keywords]:
+                        where = {"doc_type": "pitch_deck", "page_number": {"$in": slide_pages[keywords]}}
+                groups[json.dumps(where, sort_keys=True)][json.dumps(spec, sort_keys=True)] = (spec, where)
+            
+            contexts = {}
+            for group in groups.values():
+                members = list(group.items())
+                where = members[0][1][1]
+                results = self.collection.query(
+                    query_embeddings=[vectors[spec['question']] for _, (spec, _) in members],
+                    n_results=max(self._candidate_count(spec.get('n_results', 5)) for _, (spec, _) in members),
+                    where=self._where(startup_id, where)
+                )
+                for i, (signature, (spec, _)) in enumerate(members):
+                    n_results = spec.get('n_results', 5)
+                    keep = self._candidate_count(n_results)
+                    single = {field: [results[field][i][:keep]] for field in ('ids', 'documents', 'metadatas')}
+                    contexts[signature] = self._combine_results(
+                        single, spec['question'], startup_id, n_results, where, spec.get('cite', False)
+                    )
+            
+            return {key: contexts[json.dumps(spec, sort_keys=True)] for key, spec in specs.items()}
+            
+        except Exception as e:
+            print(f"❌ Error in batched RAG query: {e}")
+            return {key: "" for key in specs}
+    
     def query_by_doc_type(self, question, startup_id, doc_type, n_results=3):
         """Query specific document type"""
+        return self.query(question, startup_id, n_results, where={"doc_type": doc_type})
+    
+    def find_slides(self, startup_id, keywords):
+        """
+        Page numbers of pitch deck slides whose title mentions any keyword
+        
+        e.g. find_slides(startup_id, ["team", "founder"]) -> [9, 10]
+        """
         try:
-            query_embedding = self.embeddings.embed_query(question)
+            slides = self.collection.get(
+                where=self._where(startup_id, {"doc_type": "pitch_deck"}),
+                include=["metadatas"]
+            )
+            keywords = [keyword.lower() for keyword in keywords]
+            return sorted({
+                metadata['page_number']
+                for metadata in slides['metadatas']
+                if 'page_number' in metadata
+                and any(keyword in metadata.get('slide_title', '').lower() for keyword in keywords)
+            })
+        except Exception as e:
+            print(f"❌ Error finding slides: {e}")
+            return []
+    
+    def query_slides(self, question, startup_id, keywords, n_results=3, cite=False):
+        """Query only the pitch deck slides titled with one of keywords, or everything if none are"""
+        pages = self.find_slides(startup_id, keywords)
+        where = {"doc_type": "pitch_deck", "page_number": {"$in": pages}} if pages else None
+        return self.query(question, startup_id, n_results, where=where, cite=cite)
+    
+    def _where(self, startup_id, where=None):
+        """Chroma filter for one startup, optionally narrowed by extra conditions"""
+        if not where:
+            return {"startup_id": startup_id}
+        conditions = [{key: value} for key, value in where.items() if key != "$and"]
+        conditions += where.get("$and", [])
+        return {"$and": [{"startup_id": startup_id}] + conditions}
+    
+    def _candidate_count(self, n_results):
+        """How many vector hits to fetch before fusion"""
+        return n_results * HYBRID_CANDIDATE_FACTOR if HYBRID_SEARCH else n_results
+    
+    def _combine_results(self, results, question, startup_id, n_results, where=None, cite=False):
+        """
+        Fuse vector hits with BM25 hits (reciprocal-rank fusion) and join the
+        top n_results chunks into one context string
+        """
+        if not results['ids'] or not results['ids'][0]:
+            return ""
+        
+        documents = dict(zip(results['ids'][0], results['documents'][0]))
+        metadatas = dict(zip(results['ids'][0], results['metadatas'][0]))
+        ranked = results['ids'][0]
+        
+        if HYBRID_SEARCH:
+            lexical = self.lexical.search(startup_id, question, self._candidate_count(n_results), where)
+            ranked = reciprocal_rank_fusion([ranked, lexical])
+        ranked = ranked[:n_results]
+        
+        # Lexical-only hits were not returned by the vector query
+        missing = [chunk_id for chunk_id in ranked if chunk_id not in documents]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            documents.update(zip(fetched['ids'], fetched['documents']))
+            metadatas.update(zip(fetched['ids'], fetched['metadatas']))
+        
+        chunks = []
+        for chunk_id in ranked:
+            if chunk_id not in documents:
+                continue
+            if cite:
+                chunks.append(f"[{source_label(metadatas.get(chunk_id) or {})}]\n{documents[chunk_id]}")
+            else:
+                chunks.append(documents[chunk_id])
+        return "\n\n---\n\n".join(chunks)
+    
+    # ---------------- SIMILAR STARTUPS ----------------
+    
+    def _centroid_lock(self, startup_id):
+        with self._facts_lock:
+            return self._centroid_locks[startup_id]
+    
+    def _update_centroid(self, startup_id, vector_sum, count):
+        """Fold a batch of new chunk vectors into the startup's running centroid (negative count removes them)"""
+        with self._centroid_lock(startup_id):
+            self._update_centroid_locked(startup_id, vector_sum, count)
+    
+    def _update_centroid_locked(self, startup_id, vector_sum, count):
+        try:
+            existing = self.centroids.get(ids=[startup_id], include=["embeddings", "metadatas"])
+            metadata = {"startup_id": startup_id, "chunk_count": 0}
+            total = np.asarray(vector_sum, dtype=np.float32)
             
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where={
-                    "$and": [
-                        {"startup_id": startup_id},
-                        {"doc_type": doc_type}
-                    ]
-                }
+            if existing['ids']:
+                metadata.update(existing['metadatas'][0] or {})
+                previous = np.asarray(existing['embeddings'][0], dtype=np.float32)
+                total = total + previous * metadata['chunk_count']
+            
+            metadata['chunk_count'] += count
+            if metadata['chunk_count'] <= 0:
+                # Every document of the startup was removed
+                self.centroids.delete(ids=[startup_id])
+                return
+            self.centroids.upsert(
+                ids=[startup_id],
+                embeddings=[(total / metadata['chunk_count']).tolist()],
+                metadatas=[metadata]
             )
+        except Exception as e:
+            print(f"⚠️ Could not update centroid for {startup_id}: {e}")
+    
+    def update_startup_profile(self, startup_id, company_info):
+        """
+        Attach name / sector / stage / location from DataExtractionAgent to
+        the centroid entry, which marks the startup as analysed: only
+        analysed startups are offered by similar_startups
+        """
+        with self._centroid_lock(startup_id):
+            self._update_profile_locked(startup_id, company_info)
+    
+    def _update_profile_locked(self, startup_id, company_info):
+        try:
+            existing = self.centroids.get(ids=[startup_id], include=["metadatas"])
+            if not existing['ids']:
+                return
             
-            if results['documents'] and results['documents'][0]:
-                context = "\n\n---\n\n".join(results['documents'][0])
-                return context
+            metadata = existing['metadatas'][0] or {}
+            for key in ("name", "sector", "stage", "location"):
+                value = company_info.get(key)
+                if value:
+                    metadata[key] = str(value)
+            metadata["analysed"] = True
+            self.centroids.update(ids=[startup_id], metadatas=[metadata])
+        except Exception as e:
+            print(f"⚠️ Could not update profile for {startup_id}: {e}")
+    
+    def similar_startups(self, startup_id, k=5, sector=None, stage=None):
+        """
+        Find the k analysed startups whose documents are closest to this one
+        
+        Args:
+            startup_id: Startup to compare against
+            k: Number of neighbours to return
+            sector, stage: Optional exact-match filters
+        
+        Returns:
+            List of dicts with startup_id, name, sector, stage and similarity (0-1)
+        """
+        try:
+            existing = self.centroids.get(ids=[startup_id], include=["embeddings"])
+            if not existing['ids'] or self.centroids.count() < 2:
+                return []
             
-            return ""
+            # Decks that were only uploaded (or replaced) have no profile and are skipped
+            filters = [{"analysed": True}]
+            filters += [{key: value} for key, value in (("sector", sector), ("stage", stage)) if value]
+            where = filters[0] if len(filters) == 1 else {"$and": filters}
+            
+            results = self.centroids.query(
+                query_embeddings=[existing['embeddings'][0]],
+                n_results=min(k + 1, self.centroids.count()),
+                where=where,
+                include=["metadatas", "distances"]
+            )
+            
+            similar = []
+            for other_id, metadata, distance in zip(results['ids'][0], results['metadatas'][0], results['distances'][0]):
+                if other_id == startup_id:
+                    continue
+                similar.append({
+                    "startup_id": other_id,
+                    "name": metadata.get("name", "Unknown"),
+                    "sector": metadata.get("sector", "Unknown"),
+                    "stage": metadata.get("stage", "Unknown"),
+                    "similarity": round(1 - distance, 3)
+                })
+            return similar[:k]
             
         except Exception as e:
-            print(f"❌ Error querying by doc type: {e}")
-
+            print(f"❌ Error finding similar startups: {e}")
+            return []
+    
+    # ---------------- SNAPSHOTS ----------------
+    
+    def export_startup(self, startup_id, path):
+        """
+        Write one startup's chunks, metadata and vectors to a compact snapshot
+        
+        Vectors are stored as int8 with a per-row scale and the file is a
+        compressed .npz, so it can be copied between machines and loaded
+        back without re-embedding. It is written to path exactly as given.
+        
+        Returns:
+            Number of chunks exported
+        """
+        ids, documents, metadatas, vectors = [], [], [], []
+        page_size = self._max_batch_size()
+        offset = 0
+        while True:
+            page = self.collection.get(
+                where={"startup_id": startup_id},
+                include=["documents", "metadatas", "embeddings"],
+                limit=page_size,
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            ids.extend(page['ids'])
+            documents.extend(page['documents'])
+            metadatas.extend(page['metadatas'])
+            vectors.append(np.asarray(page['embeddings'], dtype=np.float32))
+            offset += len(page['ids'])
+        
+        if not ids:
+            print(f"⚠️ Nothing indexed for startup {startup_id}")
+            return 0
+        
+        matrix = np.concatenate(vectors)
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+        
+        payload = {
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "startup_id": startup_id,
+            "embedding_model": EMBEDDING_MODEL,
+            "ids": ids,
+            "documents": documents,
+            "metadatas": metadatas,
+        }
+        # Through a file object: given a path without .npz, numpy would add the suffix
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                payload=np.frombuffer(json.dumps(payload).encode("utf-8"), dtype=np.uint8),
+                vectors=quantized,
+                scales=scales.astype(np.float32)
+            )
+        
+        print(f"✅ Exported {len(ids)} chunks of {startup_id} to {path}")
+        return len(ids)
+    
+    def import_startup(self, path):
+        """
+        Bulk-load a snapshot written by export_startup, without calling the embedding model
+        
+        Whatever is indexed for the snapshot's startup is replaced: its chunks,
+        centroid, numeric facts, near-duplicate index and ingest stats are
+        rebuilt from the snapshot alone.
+        
+        Returns:
+            The startup_id stored in the snapshot
+        """
+        with np.load(path, allow_pickle=False) as snapshot:
+            payload = json.loads(snapshot['payload'].tobytes().decode("utf-8"))
+            vectors = snapshot['vectors'].astype(np.float32) * snapshot['scales'][:, None]
+        
+        if payload.get("format") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format: {payload.get('format')}")
+        if payload.get("embedding_model") != EMBEDDING_MODEL:
+            raise ValueError(
+                f"Snapshot was embedded with {payload.get('embedding_model')}, "
+                f"this index uses {EMBEDDING_MODEL}"
+            )
+        
+        startup_id = payload['startup_id']
+        removed = self.clear_startup(startup_id)
+        if removed:
+            print(f"🗑️ Replacing {removed} chunks already indexed for {startup_id}")
+        
+        ids = payload['ids']
+        batch_size = self._max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self._with_retries(
+                self.collection.upsert,
+                documents=payload['documents'][start:end],
+                embeddings=vectors[start:end].tolist(),
+                metadatas=payload['metadatas'][start:end],
+                ids=ids[start:end]
+            )
+        
+        if ids:
+            self._index_batch(startup_id, ids, payload['documents'], payload['metadatas'])
+            self.dedup.add(startup_id, ids, payload['documents'])
+            self._update_centroid(startup_id, vectors.sum(axis=0), len(ids))
+        
+        # Kept chunks record how many copies were dropped at the original ingest
+        dropped = sum(metadata.get("duplicate_count", 0) for metadata in payload['metadatas'])
+        seen = len(ids) + dropped
+        with self._facts_lock:
+            self.ingest_stats[startup_id] = {
+                "chunks_seen": seen,
+                "duplicates_dropped": dropped,
+                "dedupe_ratio": round(dropped / seen, 3) if seen else 0.0,
+            }
+        
+        print(f"✅ Imported {len(ids)} chunks of {startup_id} from {path}")
+        return startup_id
+    
+    def clear_startup(self, startup_id, keep_analysed=False):
+        """
+        Drop every chunk, fact and counter of a startup, and its centroid
+        
+        Args:
+            startup_id: Startup to remove
+            keep_analysed: keep the centroid of an analysed startup, so it is
+                still offered by similar_startups
+        
+        Returns:
+            Number of chunks removed
+        """
+        ids = self.collection.get(where={"startup_id": startup_id}, include=[])['ids']
+        if ids:
+            self.collection.delete(ids=ids)
+        self.lexical.remove(startup_id, ids)
+        self.dedup.remove(startup_id, ids)
+        with self._facts_lock:
+            self.metric_facts.pop(startup_id, None)
+            self.ingest_stats.pop(startup_id, None)
+            self._dropped.pop(startup_id, None)
+        with self._centroid_lock(startup_id):
+            existing = self.centroids.get(ids=[startup_id], include=["metadatas"])
+            if existing['ids'] and not (keep_analysed and (existing['metadatas'][0] or {}).get("analysed")):
+                self.centroids.delete(ids=[startup_id])
+        return len(ids)
+    
+    # ---------------- ASYNC API ----------------
+    # Embeddings go through the endpoint's async HTTP client; Chroma calls are
+    # blocking, so they run in the default thread pool off the event loop.
+    
+    def _async_limit(self):
+        """Per-event-loop semaphore bounding concurrent embedding requests and ingest batches in flight"""
+        loop = asyncio.get_running_loop()
+        with self._async_semaphores_lock:
+            if loop not in self._async_semaphores:
+                self._async_semaphores[loop] = asyncio.Semaphore(ASYNC_MAX_CONNECTIONS)
+            return self._async_semaphores[loop]
+    
+    async def _awith_retries(self, fn, *args):
+        """Await fn, retrying transient failures with exponential backoff and jitter"""
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return await fn(*args)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES:
+                    raise
+                delay = EMBED_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+                print(f"⚠️ {getattr(fn, '__name__', 'call')} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
+    async def aadd_documents(self, extracted_data, startup_id, progress_callback=None):
+        """Async version of add_documents"""
+        all_chunks, metadatas, ids = self._build_records(extracted_data, startup_id)
+        all_chunks, metadatas, ids = self._drop_near_duplicates(startup_id, all_chunks, metadatas, ids)
+        if not all_chunks:
+            return 0
+        
+        limit = self._async_limit()
+        batch_size = max(1, min(EMBED_BATCH_SIZE, self._max_batch_size()))
+        progress = {"added": 0, "sum": None}
+        
+        async def ingest(start, end):
+            # Texts are materialized once the batch holds a slot, so only the
+            # batches in flight are in memory as strings
+            async with limit:
+                texts = [str(chunk) for chunk in all_chunks[start:end]]
+                try:
+                    vectors = await self._awith_retries(self.embeddings.aembed_documents, texts)
+                    await asyncio.to_thread(
+                        self._with_retries,
+                        self.collection.add,
+                        documents=texts,
+                        embeddings=vectors,
+                        metadatas=metadatas[start:end],
+                        ids=ids[start:end]
+                    )
+                except Exception:
+                    await asyncio.to_thread(self._discard_batch, startup_id, ids[start:end])
+                    raise
+                self._index_batch(startup_id, ids[start:end], texts, metadatas[start:end])
+            progress["added"] += end - start
+            batch_sum = np.asarray(vectors, dtype=np.float32).sum(axis=0)
+            progress["sum"] = batch_sum if progress["sum"] is None else progress["sum"] + batch_sum
+            if progress_callback:
+                progress_callback(progress["added"], len(all_chunks))
+        
+        outcomes = await asyncio.gather(
+            *(ingest(start, min(start + batch_size, len(all_chunks)))
+              for start in range(0, len(all_chunks), batch_size)),
+            return_exceptions=True
+        )
+        
+        failures = [o for o in outcomes if isinstance(o, Exception)]
+        if failures:
+            print(f"⚠️ {len(failures)} of {len(outcomes)} batches could not be indexed: {failures[0]}")
+        
+        if progress["added"]:
+            await asyncio.to_thread(self._update_centroid, startup_id, progress["sum"], progress["added"])
+        
+        print(f"✅ Added {progress['added']} chunks to RAG system")
+        return progress["added"]
+    
+    async def aquery(self, question, startup_id, n_results=5, doc_type=None, where=None, cite=False):
+        """Async version of query (doc_type narrows like query_by_doc_type)"""
+        try:
+            async with self._async_limit():
+                query_embedding = await self.embeddings.aembed_query(question)
+            
+            if doc_type:
+                where = {**(where or {}), "doc_type": doc_type}
+            
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=[query_embedding],
+                n_results=self._candidate_count(n_results),
+                where=self._where(startup_id, where)
+            )
+            return await asyncio.to_thread(
+                self._combine_results, results, question, startup_id, n_results, where, cite
+            )
+            
+        except Exception as e:
+            print(f"❌ Error querying RAG: {e}")
             return ""
+    
+    async def aquery_many(self, questions, startup_id, n_results=5):
+        """
+        Run several queries concurrently on the current event loop
+        
+        Args:
+            questions: list of question strings
+            startup_id: Filter by startup
+            n_results: Number of results per question
+        
+        Returns:
+            List of contexts, in the same order as questions
+        """
+        return list(await asyncio.gather(
+            *(self.aquery(question, startup_id, n_results) for question in questions)
+        ))
 
 
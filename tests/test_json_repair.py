@@ -0,0 +1,79 @@
+import pytest
+
+from services.json_repair import JSONRepairError, parse_json, repair_json, repair_stats
+
+
+def test_clean_json_is_untouched():
+    assert repair_json('{"a": [1, 2]}') == ({"a": [1, 2]}, "clean", [])
+
+
+def test_markdown_fence_and_prose():
+    data, status, fixes = repair_json('Here you go:\n```json\n{"a": 1}\n```\nHope that helps')
+    assert (data, status) == ({"a": 1}, "repaired")
+    assert "leading text" in fixes and "trailing text" in fixes
+
+
+def test_trailing_commas():
+    data, status, fixes = repair_json('{"a": [1, 2,], "b": 3,}')
+    assert data == {"a": [1, 2], "b": 3}
+    assert status == "repaired" and fixes == ["trailing commas"]
+
+
+def test_single_quotes():
+    data, _, fixes = repair_json("{'name': 'Acme', 'note': 'it\\'s live'}")
+    assert data == {"name": "Acme", "note": "it's live"}
+    assert "single quotes" in fixes
+
+
+def test_unescaped_quotes_inside_string():
+    data, _, fixes = repair_json('{"thesis": "A "category-defining" product", "score": 7}')
+    assert data == {"thesis": 'A "category-defining" product', "score": 7}
+    assert "unescaped quotes" in fixes
+
+
+def test_raw_newlines_python_literals_and_comments():
+    data, _, fixes = repair_json('{"a": "line 1\nline 2", "b": True, "c": None // not stated\n}')
+    assert data == {"a": "line 1\nline 2", "b": True, "c": None}
+    assert {"control characters", "python literals", "comments"} <= set(fixes)
+
+
+def test_truncated_string():
+    data, status, fixes = repair_json('{"decision": "MAYBE", "next_steps": "Verify the ARR cla')
+    assert data == {"decision": "MAYBE", "next_steps": "Verify the ARR cla"}
+    assert status == "repaired" and "truncated" in fixes
+
+
+def test_truncated_containers():
+    data, status, fixes = repair_json('{"flags": [{"title": "Churn", "severity": "HIGH"}, {"title": "Burn"')
+    assert data == {"flags": [{"title": "Churn", "severity": "HIGH"}, {"title": "Burn"}]}
+    assert status == "repaired" and "truncated" in fixes
+
+
+def test_mismatched_bracket():
+    data, _, fixes = repair_json('{"a": [1, 2}, "b": 3}')
+    assert data["a"] == [1, 2]
+    assert "unbalanced brackets" in fixes
+
+
+def test_prefix_salvage_drops_broken_tail():
+    data, status, fixes = repair_json('{"a": 1, "b": [2, 3], "c": @@@')
+    assert data == {"a": 1, "b": [2, 3]}
+    assert status == "salvaged" and "longest valid prefix" in fixes
+
+
+def test_unrepairable():
+    with pytest.raises(JSONRepairError):
+        repair_json("I could not analyse this startup.")
+
+
+def test_repair_stats_per_agent():
+    agent = "test_repair_stats_agent"
+    parse_json('{"a": 1}', agent)
+    parse_json('{"a": 1,}', agent)
+    parse_json('{"a": 1, "b": @@', agent)
+    with pytest.raises(JSONRepairError):
+        parse_json("no json here", agent)
+
+    assert repair_stats()[agent] == {
+        "clean": 1, "repaired": 1, "salvaged": 1, "failed": 1, "repair_success_rate": round(2 / 3, 3)
+    }
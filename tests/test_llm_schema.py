@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from services.agents.benchmarking_agent import BenchmarkingAgent
+from services.agents.data_extraction_agent import DataExtractionAgent
+from services.agents.growth_agent import GrowthAgent
+from services.agents.market_research_agent import MarketResearchAgent
+from services.agents.recommendation_agent import RecommendationAgent
+from services.agents.risk_detection_agent import RiskDetectionAgent
+from services.llm_client import GeminiClient, StubModel, StubResponse
+from services.llm_schema import (
+    SchemaValidationError, array, drop_invalid_items, example_for, fill_missing, integer, neutral_for, number, obj,
+    string, validate
+)
+
+SCHEMA = obj({
+    "name": string(),
+    "stage": string(enum=["Seed", "Series A", "Unknown"]),
+    "mrr": number(nullable=True),
+    "metrics": obj({"customers": integer(), "churn": number()}),
+    "risks": array(obj({"title": string(), "severity": string(enum=["LOW", "HIGH"])})),
+})
+
+AGENT_SCHEMAS = [
+    DataExtractionAgent.RESPONSE_SCHEMA,
+    RiskDetectionAgent.RESPONSE_SCHEMA,
+    MarketResearchAgent.RESPONSE_SCHEMA,
+    BenchmarkingAgent.RESPONSE_SCHEMA,
+    GrowthAgent.RESPONSE_SCHEMA,
+    RecommendationAgent.RESPONSE_SCHEMA,
+]
+
+
+def make_client(text=None):
+    """GeminiClient on the stub model, answering with text when given"""
+    client = GeminiClient("stub-model", agent="test")
+    client.model = StubModel("stub-model")
+    if text is not None:
+        client.model.generate_content = lambda prompt, **kwargs: StubResponse(text)
+    return client
+
+
+def test_validate_accepts_matching_data():
+    assert validate(example_for(SCHEMA), SCHEMA) == []
+
+
+def test_validate_reports_paths():
+    data = example_for(SCHEMA)
+    data["mrr"] = "50k"
+    data["stage"] = "Series Z"
+    data["metrics"]["customers"] = 1.5
+    del data["name"]
+    assert sorted(validate(data, SCHEMA)) == [
+        "$.metrics.customers: expected INTEGER, got float",
+        "$.mrr: expected NUMBER, got str",
+        "$.name: missing",
+        "$.stage: 'Series Z' not one of ['Seed', 'Series A', 'Unknown']",
+    ]
+
+
+def test_validate_nullable_and_booleans():
+    assert validate(None, number(nullable=True)) == []
+    assert validate(None, number()) == ["$: null not allowed"]
+    assert validate(True, integer()) == ["$: expected INTEGER, got bool"]
+
+
+def test_fill_missing_copies_only_schema_properties():
+    data = {"name": "Acme", "metrics": {"customers": 10}}
+    default = {"name": "default", "metrics": {"customers": 0, "churn": 0.1}, "stage": "Unknown", "note": "x"}
+    assert fill_missing(data, default, SCHEMA) == {
+        "name": "Acme",
+        "metrics": {"customers": 10, "churn": 0.1},
+        "stage": "Unknown",
+    }
+
+
+def test_neutral_for_matches_schema():
+    neutral = neutral_for(SCHEMA)
+    assert validate(neutral, SCHEMA) == []
+    assert neutral == {"name": "", "stage": "Unknown", "mrr": None, "metrics": {"customers": 0, "churn": 0}, "risks": []}
+
+
+def test_neutral_for_takes_numbers_from_defaults():
+    defaults = {"name": "Analysis error", "metrics": {"customers": 50, "churn": None}, "mrr": 7}
+    neutral = neutral_for(SCHEMA, defaults)
+    assert neutral["name"] == ""
+    assert neutral["metrics"] == {"customers": 50, "churn": 0}
+    assert neutral["mrr"] == 7
+
+
+def test_drop_invalid_items_removes_truncated_items():
+    data = {"risks": [{"title": "Churn", "severity": "HIGH"}, {"title": "Cut off"}]}
+    assert drop_invalid_items(data, SCHEMA) == {"risks": [{"title": "Churn", "severity": "HIGH"}]}
+
+
+@pytest.mark.parametrize("schema", AGENT_SCHEMAS)
+def test_agent_schemas_round_trip_through_stub(schema):
+    data = make_client().generate_json("prompt", schema)
+    assert data == example_for(schema)
+    assert "_repair" not in data
+
+
+@pytest.mark.parametrize("schema", AGENT_SCHEMAS)
+def test_truncated_responses_are_filled_and_marked(schema):
+    text = json.dumps(example_for(schema))
+    data = make_client(text[:len(text) // 2]).generate_json("prompt", schema)
+    assert data.pop("_repair") in ("salvaged", "truncated", "incomplete")
+    assert validate(data, schema) == []
+
+
+def test_incomplete_response_is_marked():
+    data = make_client('{"name": "Acme"}').generate_json("prompt", SCHEMA)
+    assert data["_repair"] == "incomplete"
+    assert data["metrics"] == {"customers": 0, "churn": 0}
+
+
+def test_missing_scores_use_agent_defaults():
+    agent = RecommendationAgent.__new__(RecommendationAgent)
+    data = make_client('{"decision": "INVEST"}').generate_json(
+        "prompt", RecommendationAgent.RESPONSE_SCHEMA, agent._get_default_structure()
+    )
+    assert data["deal_score"] == 50 and data["confidence"] == 50
+    assert data["key_concerns"] == []
+    assert data["_repair"] == "incomplete"
+
+
+def test_response_cut_off_inside_a_string_is_marked():
+    data = make_client('{"stage": "Seed", "mrr": null, "metrics": {"customers": 3, "churn": 1}, "risks": [], '
+                       '"name": "Verify the ARR cla').generate_json("prompt", SCHEMA)
+    assert data["name"] == "Verify the ARR cla"
+    assert data["_repair"] == "truncated"
+
+
+def test_wrong_types_raise():
+    with pytest.raises(SchemaValidationError):
+        make_client('{"name": 5}').generate_json("prompt", SCHEMA)